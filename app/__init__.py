@@ -1,4 +1,5 @@
-from flask import Flask, render_template, redirect, url_for, flash, current_app
+import click
+from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
@@ -7,9 +8,7 @@ from app.config import Config
 from datetime import datetime
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
-from sqlalchemy.exc import OperationalError
-import time
-import random
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -23,6 +22,12 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Trust X-Forwarded-* from the proxies in front of the app, so
+    # request.remote_addr is the client's address rather than the proxy's
+    if app.config['PROXY_FIX_HOPS']:
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    
     # Configure SQLite specific settings if using SQLite
     if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
         configure_sqlite()
@@ -46,21 +51,58 @@ def create_app(config_class=Config):
 
 def configure_sqlite():
     """Configure SQLite-specific settings for better performance"""
-    @event.listens_for(Engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")  # Enable foreign key constraints
-        cursor.execute("PRAGMA journal_mode=WAL")  # Better for concurrency
-        cursor.execute("PRAGMA busy_timeout=5000")  # Wait up to 5 seconds if locked
-        cursor.execute("PRAGMA synchronous=NORMAL")  # Good balance between safety and performance
-        cursor.close()
+    if not event.contains(Engine, "connect", set_sqlite_pragma):
+        event.listen(Engine, "connect", set_sqlite_pragma)
+        event.listen(Engine, "begin", begin_sqlite)
+
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")  # Enable foreign key constraints
+    cursor.execute("PRAGMA journal_mode=WAL")  # Better for concurrency
+    cursor.execute("PRAGMA busy_timeout=5000")  # Wait up to 5 seconds if locked
+    cursor.execute("PRAGMA synchronous=NORMAL")  # Good balance between safety and performance
+    cursor.close()
+
+def begin_sqlite(conn):
+    # The sqlite3 driver only opens a transaction at the first write; a connection
+    # asking for sqlite_begin (the single writer) takes the write lock straight away
+    mode = conn.get_execution_options().get("sqlite_begin")
+    if mode and conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(f"BEGIN {mode}")
 
 def initialize_extensions(app):
     """Initialize Flask extensions with the application"""
+    from app.auth.availability import taken_names
+    from app.auth.identity import user_identities
+    from app.auth.last_seen import last_seen
+    from app.game.levels import levels
+    from app.game.reaper import game_reaper
+    from app.leaderboard.boards import board_cache
+    from app.leaderboard.live import live_leaderboard
+    from app.leaderboard.ranks import rank_index
+    from app.limits import admission
+    from app.game.store import active_games
+    from app.passwords import password_hasher
+    from app.race.engine import races
+    from app.writer import writer
+    
+    admission.init_app(app)
     db.init_app(app)
+    writer.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    user_identities.init_app(app)
+    taken_names.init_app(app)
+    password_hasher.init_app(app)
+    last_seen.init_app(app)
     bootstrap.init_app(app)
+    active_games.init_app(app)
+    levels.init_app(app)
+    races.init_app(app)
+    game_reaper.init_app(app)
+    board_cache.init_app(app)
+    live_leaderboard.init_app(app)
+    rank_index.init_app(app)
 
 def register_blueprints(app):
     """Register all application blueprints"""
@@ -70,6 +112,8 @@ def register_blueprints(app):
     from app.errors import bp as errors_bp
     from app.leaderboard import bp as leaderboard_bp
     from app.admin import bp as admin_bp
+    from app.api import bp as api_bp
+    from app.race import bp as race_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -77,6 +121,8 @@ def register_blueprints(app):
     app.register_blueprint(errors_bp)
     app.register_blueprint(leaderboard_bp, url_prefix='/leaderboard')
     app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(race_bp)
 
 def register_template_utilities(app):
     """Register custom template filters and context processors"""
@@ -87,6 +133,13 @@ def register_template_utilities(app):
             return ""
         return value.strftime(format)
     
+    @app.before_request
+    def record_last_seen():
+        """Note the signed-in user's activity; written in batches later"""
+        from app.auth.last_seen import last_seen
+        if request.endpoint != 'static' and current_user.is_authenticated:
+            last_seen.touch(current_user.id)
+    
     @app.teardown_request
     def shutdown_session(exception=None):
         """Ensure database session is removed after each request"""
@@ -113,6 +166,107 @@ def register_commands(app):
             else:
                 print('Admin user already exists')
     
+    @app.cli.command('reap-games')
+    @click.option('--older-than', type=int, default=None,
+                  help='Seconds without activity before a game is abandoned.')
+    @click.option('--batch-size', type=int, default=None,
+                  help='Games completed per UPDATE.')
+    def reap_games(older_than, batch_size):
+        """Complete games that players have abandoned"""
+        from app.game.reaper import game_reaper
+        with app.app_context():
+            reaped = game_reaper.reap(max_idle=older_than, batch_size=batch_size)
+            print(f'Reaped {reaped} abandoned games')
+    
+    @app.cli.command('rebuild-leaderboard')
+    def rebuild_leaderboard():
+        """Recompute the leaderboards from all won games"""
+        from app.leaderboard import boards
+        with app.app_context():
+            rows = boards.rebuild()
+            print(f'Leaderboard rebuilt with {rows} entries')
+    
+    @app.cli.command('backfill-rollups')
+    def backfill_rollups():
+        """Rebuild the daily, weekly and monthly leaderboard rollups from all games"""
+        from app.leaderboard import boards, rollups
+        with app.app_context():
+            rows = rollups.backfill()
+            boards.board_cache.invalidate()
+            print(f'Rollups rebuilt with {rows} rows')
+    
+    @app.cli.command('benchmark-leaderboard')
+    @click.option('--games', type=int, default=0,
+                  help='Benchmark a throwaway SQLite database with this many synthetic games '
+                       'instead of the configured database.')
+    @click.option('--players', type=int, default=1000, help='Synthetic players to create.')
+    @click.option('--repeat', type=int, default=20, help='Timed runs per strategy.')
+    def benchmark_leaderboard(games, players, repeat):
+        """Compare per-board queries, window functions and the leaderboard table"""
+        import tempfile
+        from app.leaderboard import benchmark
+        
+        size = app.config['LEADERBOARD_SIZE']
+        if not games:
+            with app.app_context():
+                results = benchmark.run(size, repeat)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                class BenchmarkConfig(Config):
+                    SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp}/benchmark.db'
+                    SQLALCHEMY_ENGINE_OPTIONS = {}
+                    ACTIVE_GAME_STORE = False
+                    GAME_REAPER_INTERVAL = 0
+                
+                bench_app = create_app(BenchmarkConfig)
+                with bench_app.app_context():
+                    print(f'Seeding {games} games for {players} players...')
+                    benchmark.seed(games, players)
+                    results = benchmark.run(size, repeat)
+                    db.session.remove()
+                    db.engine.dispose()
+        
+        print(f"{'strategy':<14}{'median ms':>12}{'queries':>10}")
+        for name, (median, queries) in results.items():
+            print(f'{name:<14}{median:>12.2f}{queries:>10.0f}')
+    
+    @app.cli.command('benchmark-passwords')
+    @click.option('--logins', type=int, default=200, help='Password checks to run.')
+    @click.option('--concurrency', type=int, default=16, help='Simultaneous logins.')
+    @click.option('--inline', is_flag=True, help='Hash on the calling threads instead of the pool.')
+    def benchmark_passwords(logins, concurrency, inline):
+        """Time concurrent password checks under the configured hash policy"""
+        from app.passwords import benchmark, password_hasher
+        
+        if inline:
+            password_hasher.workers = 0
+        mode = 'inline' if inline else (
+            f'{password_hasher.workers} processes, queue {password_hasher.queue_size}'
+        )
+        print(f'{password_hasher.method}, {mode}, {concurrency} concurrent logins')
+        p50, p99, elapsed, rejected = benchmark(logins, concurrency)
+        if p50 is None:
+            print(f'All {rejected} logins were rejected')
+            return
+        print(f'p50 {p50:.0f} ms, p99 {p99:.0f} ms, {logins / elapsed:.1f} logins/s, '
+              f'{rejected} rejected as busy')
+    
+    from app.game.stress import stress_guesses
+    app.cli.add_command(stress_guesses)
+    
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if a hot query would scan or sort a whole table"""
+        from app.query_plans import check_query_plans
+        with app.app_context():
+            plans, failures = check_query_plans()
+            for name, steps in plans.items():
+                print(f"{'FAIL' if name in failures else 'ok':4}  {name}")
+                for step, problem in steps:
+                    print(f"        {'!' if problem else ' '} {step}")
+            if failures:
+                raise SystemExit(f'{len(failures)} queries no longer use an index')
+    
     @app.cli.command('seed-words')
     def seed_words():
         """Add sample words to database"""
@@ -153,58 +307,3 @@ def setup_database(app):
     """Setup database and create tables if they don't exist"""
     with app.app_context():
         db.create_all()
-
-# Import models after app creation to avoid circular imports
-from app.models import User
-from app.auth.forms import RegistrationForm
-
-def register_auth_routes(bp):
-    """Register auth routes with the blueprint"""
-    @bp.route('/register', methods=['GET', 'POST'])
-    def register():
-        if current_user.is_authenticated:
-            return redirect(url_for('main.index'))
-
-        form = RegistrationForm()
-        if form.validate_on_submit():
-            # Check for existing user first (no transaction needed)
-            if User.query.filter_by(username=form.username.data).first():
-                flash('Username already taken', 'danger')
-                return render_template('auth/register.html', form=form)
-            if User.query.filter_by(email=form.email.data).first():
-                flash('Email already registered', 'danger')
-                return render_template('auth/register.html', form=form)
-
-            # Configure retry parameters
-            max_attempts = 5
-            base_delay = 0.5  # seconds
-
-            for attempt in range(max_attempts):
-                try:
-                    user = User(
-                        username=form.username.data,
-                        email=form.email.data
-                    )
-                    user.set_password(form.password.data)
-                    db.session.add(user)
-                    db.session.commit()
-                    flash('Registration successful! Please login.', 'success')
-                    return redirect(url_for('auth.login'))
-
-                except OperationalError as e:
-                    db.session.rollback()
-                    current_app.logger.warning(f'Database locked (attempt {attempt + 1}): {str(e)}')
-                    
-                    # Exponential backoff with jitter
-                    delay = min((base_delay * (2 ** attempt)) + random.uniform(0, 0.1), 5)
-                    time.sleep(delay)
-
-                except Exception as e:
-                    db.session.rollback()
-                    current_app.logger.error(f'Registration error: {str(e)}')
-                    flash('Error creating account. Please try again.', 'danger')
-                    return render_template('auth/register.html', form=form)
-
-            flash('Database is busy. Please try again later.', 'warning')
-        
-        return render_template('auth/register.html', form=form)
\ No newline at end of file
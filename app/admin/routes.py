@@ -1,10 +1,19 @@
 from flask import render_template, redirect, url_for, flash, request, abort, current_app
 from flask_login import current_user, login_required
 from functools import wraps
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 from app import db
-from app.models import User, GameSession, Feedback, Word, Setting
+from app.models import User, GameSession, Feedback, Word
+from app.auth.availability import report_taken, taken_names
+from app.auth.identity import user_identities
+from app.game.levels import levels
+from app.leaderboard.boards import board_cache
+from app.limits import admission
 from app.admin import bp
+from app.utils import after_commit
+from app.writer import writer
 from app.admin.forms import (
     AdminEditUserForm, 
     LevelSettingsForm,
@@ -29,13 +38,23 @@ def admin_required(f):
 def require_admin():
     pass  # Just forces the admin requirement check
 
+def open_game_count():
+    """Count unfinished games from the partial index of open games"""
+    # The created_at bound lets SQLite search that index rather than scan another
+    return db.session.scalar(
+        db.select(db.func.count()).select_from(GameSession).where(
+            GameSession.completed == False,
+            GameSession.created_at <= datetime.utcnow()
+        )
+    )
+
 @bp.route('/')
 def dashboard():
     """Admin dashboard with statistics"""
     stats = {
         'total_users': User.query.count(),
         'total_games': GameSession.query.count(),
-        'active_games': GameSession.query.filter_by(completed=False).count(),
+        'active_games': open_game_count(),
         'total_feedback': Feedback.query.count(),
         'new_users': User.query.filter(
             User.created_at > datetime.utcnow() - timedelta(days=7)
@@ -43,7 +62,12 @@ def dashboard():
         'active_users': User.query.filter_by(is_active=True).count(),
         'total_words': Word.query.count()
     }
-    return render_template('admin/dashboard.html', stats=stats)
+    return render_template(
+        'admin/dashboard.html',
+        stats=stats,
+        leaderboard_cache=board_cache.stats(),
+        admission=admission.stats()
+    )
 
 # User Management Routes
 @bp.route('/users')
@@ -57,18 +81,66 @@ def manage_users():
     )
     return render_template('admin/users.html', users=users)
 
+def update_user(user_id, form):
+    """Write unit: copy the edit form onto a user"""
+    user = db.session.get(User, user_id)
+    form.populate_obj(user)
+    after_commit(user_identities.invalidate, user_id)
+    db.session.flush()
+
+def set_user_active(user_id, active):
+    """Write unit: activate or deactivate a user"""
+    db.session.get(User, user_id).is_active = active
+    after_commit(user_identities.invalidate, user_id)
+
+def remove_user(user_id):
+    """Write unit: delete a user account"""
+    db.session.delete(db.session.get(User, user_id))
+    after_commit(user_identities.invalidate, user_id)
+
+def remove_feedback(feedback_id):
+    """Write unit: delete a feedback message"""
+    db.session.delete(db.session.get(Feedback, feedback_id))
+
+def save_levels(changes):
+    """Write unit: update level settings from ``{level: {field: value}}``.
+
+    ``min``, ``max`` and ``attempts`` are checked by Setting.update_ranges,
+    which raises ValueError; other fields are set as given.
+    """
+    for level, values in changes.items():
+        values = dict(values)
+        setting = levels.setting(level)
+        setting.update_ranges(values.pop('min'), values.pop('max'), values.pop('attempts'))
+        for field, value in values.items():
+            setattr(setting, field, value)
+    levels.publish()
+
+def insert_word(text, difficulty):
+    """Write unit: add a word"""
+    db.session.add(Word(text=text, difficulty=difficulty))
+
+def update_word(word_id, form):
+    """Write unit: copy the edit form onto a word"""
+    form.populate_obj(db.session.get(Word, word_id))
+
+def remove_word(word_id):
+    """Write unit: delete a word"""
+    db.session.delete(db.session.get(Word, word_id))
+
 @bp.route('/user/<int:user_id>', methods=['GET', 'POST'])
 def edit_user(user_id):
     user = User.query.get_or_404(user_id)
-    form = AdminEditUserForm(
-        original_username=user.username,
-        original_email=user.email,
-        obj=user
-    )
+    form = AdminEditUserForm(obj=user)
 
     if form.validate_on_submit():
-        form.populate_obj(user)
-        db.session.commit()
+        try:
+            writer.run(update_user, user.id, form)
+        except IntegrityError:
+            # The unique constraints are the only uniqueness check
+            report_taken(form, user.id)
+            return render_template('admin/edit_user.html', form=form, user=user)
+        taken_names.add(form.username.data, form.email.data)
         flash('User updated successfully!', 'success')
         return redirect(url_for('admin.manage_users'))
 
@@ -78,13 +150,12 @@ def edit_user(user_id):
 def toggle_user(user_id):
     """Toggle user active status"""
     user = User.query.get_or_404(user_id)
-    user.is_active = not user.is_active
+    active = not user.is_active
     try:
-        db.session.commit()
-        status = 'activated' if user.is_active else 'deactivated'
+        writer.run(set_user_active, user.id, active)
+        status = 'activated' if active else 'deactivated'
         flash(f'User {status} successfully', 'success')
     except Exception as e:
-        db.session.rollback()
         current_app.logger.error(f'Error toggling user status: {str(e)}')
         flash('Error updating user status', 'danger')
     return redirect(url_for('admin.manage_users'))
@@ -98,11 +169,9 @@ def delete_user(user_id):
     
     user = User.query.get_or_404(user_id)
     try:
-        db.session.delete(user)
-        db.session.commit()
+        writer.run(remove_user, user.id)
         flash('User deleted successfully', 'success')
     except Exception as e:
-        db.session.rollback()
         current_app.logger.error(f'Error deleting user: {str(e)}')
         flash('Error deleting user', 'danger')
     return redirect(url_for('admin.manage_users'))
@@ -124,7 +193,10 @@ def manage_games():
 @bp.route('/game/<int:game_id>')
 def view_game(game_id):
     """View detailed game session"""
-    game = GameSession.query.get_or_404(game_id)
+    game = GameSession.query.options(
+        joinedload(GameSession.user),
+        joinedload(GameSession.guesses)
+    ).filter_by(id=game_id).first_or_404()
     return render_template('admin/view_game.html', game=game)
 
 # Feedback Management Routes
@@ -152,11 +224,9 @@ def delete_feedback(feedback_id):
     """Delete feedback entry"""
     feedback = Feedback.query.get_or_404(feedback_id)
     try:
-        db.session.delete(feedback)
-        db.session.commit()
+        writer.run(remove_feedback, feedback.id)
         flash('Feedback deleted successfully', 'success')
     except Exception as e:
-        db.session.rollback()
         current_app.logger.error(f'Error deleting feedback: {str(e)}')
         flash('Error deleting feedback', 'danger')
     return redirect(url_for('admin.manage_feedback'))
@@ -164,51 +234,39 @@ def delete_feedback(feedback_id):
 # Content Management Routes
 @bp.route('/manage-content')
 def manage_content():
-    # Get or create settings for each level
-    easy = Setting.get_settings('easy')
-    medium = Setting.get_settings('medium')
-    hard = Setting.get_settings('hard')
-    
-    # Set defaults if they don't exist
-    if not easy.range_low:
-        easy.range_low = 1
-        easy.range_high = 10
-        easy.max_attempts = 5
-        db.session.commit()
-    
-    if not medium.range_low:
-        medium.range_low = 1
-        medium.range_high = 50
-        medium.max_attempts = 7
-        db.session.commit()
-        
-    if not hard.range_low:
-        hard.range_low = 1
-        hard.range_high = 100
-        hard.max_attempts = 10
-        db.session.commit()
-    
+    settings = levels.all()
     return render_template('admin/manage_content.html',
-        easy_settings=easy,
-        medium_settings=medium,
-        hard_settings=hard
+        easy_settings=settings['easy'],
+        medium_settings=settings['medium'],
+        hard_settings=settings['hard']
     )
 
 @bp.route('/content/levels/<level>', methods=['GET', 'POST'])
 def edit_level(level):
     """Edit game level settings"""
-    level_setting = Setting.get_level_settings(level)
-    if not level_setting:
+    rules = levels.get(level)
+    if not rules:
         abort(404)
     
-    form = LevelSettingsForm(obj=level_setting)
+    form = LevelSettingsForm(data={
+        'min_range': rules['range'][0],
+        'max_range': rules['range'][1],
+        'attempts': rules['attempts'],
+        'multiplier': rules['multiplier']
+    })
     
     if form.validate_on_submit():
         try:
-            form.populate_obj(level_setting)
-            db.session.commit()
+            writer.run(save_levels, {level: {
+                'min': form.min_range.data,
+                'max': form.max_range.data,
+                'attempts': form.attempts.data,
+                'score_multiplier': form.multiplier.data
+            }})
             flash(f'{level.capitalize()} level settings updated', 'success')
             return redirect(url_for('admin.manage_content'))
+        except ValueError as e:
+            flash(f'Error: {str(e)}', 'danger')
         except Exception as e:
             current_app.logger.error(f'Error updating level settings: {str(e)}')
             flash('Error updating level settings', 'danger')
@@ -230,12 +288,9 @@ def add_word():
         return redirect(url_for('admin.manage_content'))
     
     try:
-        new_word = Word(text=word, difficulty=difficulty)
-        db.session.add(new_word)
-        db.session.commit()
+        writer.run(insert_word, word, difficulty)
         flash('Word added successfully', 'success')
     except Exception as e:
-        db.session.rollback()
         current_app.logger.error(f'Error adding word: {str(e)}')
         flash('Error adding word', 'danger')
     
@@ -247,8 +302,7 @@ def edit_word(word_id):
     form = EditWordForm(obj=word)
     
     if form.validate_on_submit():
-        form.populate_obj(word)
-        db.session.commit()
+        writer.run(update_word, word.id, form)
         flash('Word updated successfully!', 'success')
         return redirect(url_for('admin.manage_content'))
     
@@ -259,11 +313,9 @@ def delete_word(word_id):
     """Delete word from database"""
     word = Word.query.get_or_404(word_id)
     try:
-        db.session.delete(word)
-        db.session.commit()
+        writer.run(remove_word, word.id)
         flash('Word deleted successfully', 'success')
     except Exception as e:
-        db.session.rollback()
         current_app.logger.error(f'Error deleting word: {str(e)}')
         flash('Error deleting word', 'danger')
     return redirect(url_for('admin.manage_content'))
@@ -271,38 +323,32 @@ def delete_word(word_id):
 # System Settings Routes
 @bp.route('/settings')
 def system_settings():
-    # Get settings for all levels
-    levels = {
-        'easy': Setting.get_settings('easy'),
-        'medium': Setting.get_settings('medium'),
-        'hard': Setting.get_settings('hard')
-    }
-    
     return render_template('admin/settings.html',
-        settings=levels  # Pass as 'settings' to template
+        settings=levels.all()  # Pass as 'settings' to template
     )
 
 @bp.route('/update-ranges', methods=['POST'])
 def update_ranges():
     if request.method == 'POST':
         try:
-            levels = ['easy', 'medium', 'hard']
-            for level in levels:
-                setting = Setting.get_settings(level)
-                setting.update_ranges(
-                    request.form.get(f'{level}_min'),
-                    request.form.get(f'{level}_max'),
-                    request.form.get(f'{level}_attempts')
-                )
+            changes = {}
+            for level in ['easy', 'medium', 'hard']:
+                changes[level] = {
+                    'min': request.form.get(f'{level}_min'),
+                    'max': request.form.get(f'{level}_max'),
+                    'attempts': request.form.get(f'{level}_attempts'),
+                    'is_active': f'{level}_active' in request.form
+                }
+                multiplier = request.form.get(f'{level}_multiplier')
+                if multiplier is not None:
+                    changes[level]['score_multiplier'] = float(multiplier)
             
-            db.session.commit()
+            writer.run(save_levels, changes)
             flash('Number ranges updated successfully!', 'success')
             
         except ValueError as e:
-            db.session.rollback()
             flash(f'Error: {str(e)}', 'danger')
         except Exception as e:
-            db.session.rollback()
             flash('Failed to update ranges', 'danger')
             current_app.logger.error(f"Update error: {str(e)}")
     
@@ -311,13 +357,14 @@ def update_ranges():
 @bp.route('/settings/update', methods=['POST'])
 def update_settings():
     try:
-        for level in ['easy', 'medium', 'hard']:
-            setting = Setting.get_settings(level)
-            setting.range_low = int(request.form.get(f'{level}_min'))
-            setting.range_high = int(request.form.get(f'{level}_max'))
-            setting.max_attempts = int(request.form.get(f'{level}_attempts'))
-        
-        db.session.commit()
+        writer.run(save_levels, {
+            level: {
+                'min': request.form.get(f'{level}_min'),
+                'max': request.form.get(f'{level}_max'),
+                'attempts': request.form.get(f'{level}_attempts')
+            }
+            for level in ['easy', 'medium', 'hard']
+        })
         flash('Settings updated successfully!', 'success')
     except ValueError:
         flash('Please enter valid numbers', 'danger')
@@ -325,4 +372,4 @@ def update_settings():
         flash('Error updating settings', 'danger')
         current_app.logger.error(f"Settings update error: {str(e)}")
     
-    return redirect(url_for('admin.system_settings'))
\ No newline at end of file
+    return redirect(url_for('admin.system_settings'))
@@ -0,0 +1,13 @@
+from flask import Blueprint
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Endpoints anonymous clients may call; every other API call needs a login
+PUBLIC_ENDPOINTS = set()
+
+def public(view):
+    """Let anonymous clients call ``view``, like the public HTML page it mirrors"""
+    PUBLIC_ENDPOINTS.add(f'{bp.name}.{view.__name__}')
+    return view
+
+from app.api import errors, game, leaderboard
@@ -0,0 +1,32 @@
+from flask import jsonify
+from werkzeug.http import HTTP_STATUS_CODES
+from app.api import bp
+from app.errors import retry_headers
+
+def error_response(status_code, message=None):
+    """Build a compact JSON error response"""
+    payload = {'error': HTTP_STATUS_CODES.get(status_code, 'Unknown error')}
+    if message:
+        payload['message'] = message
+    return jsonify(payload), status_code
+
+@bp.errorhandler(400)
+def bad_request(error):
+    return error_response(400)
+
+@bp.errorhandler(404)
+def not_found(error):
+    return error_response(404)
+
+@bp.errorhandler(405)
+def method_not_allowed(error):
+    return error_response(405)
+
+
+@bp.errorhandler(429)
+def too_many_requests(error):
+    return *error_response(429, 'Slow down and retry later'), retry_headers(error)
+
+@bp.errorhandler(503)
+def service_unavailable(error):
+    return *error_response(503, 'Server is busy, please retry'), retry_headers(error)
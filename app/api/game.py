@@ -0,0 +1,130 @@
+from flask import jsonify, request
+from flask_login import current_user
+
+from app.api import PUBLIC_ENDPOINTS, bp
+from app.api.errors import error_response
+from app.game.levels import levels
+from app.game.logic import (GameConflict, create_game, end_game, load_game, new_game_fields,
+                            submit_guess, submit_guesses)
+from app.models import GameSession
+
+@bp.before_request
+def require_login():
+    """Answer unauthenticated API calls with 401 instead of a login redirect"""
+    if request.endpoint not in PUBLIC_ENDPOINTS and not current_user.is_authenticated:
+        return error_response(401, 'Login required')
+
+def game_state(game, hint=None):
+    """Compact JSON representation of a game"""
+    state = {
+        'id': game.id,
+        'level': game.level,
+        'range': [game.current_range_low, game.current_range_high],
+        'attempts_left': game.attempts_left,
+        'completed': game.completed,
+        'won': game.won,
+        'score': game.score
+    }
+    if hint is not None:
+        state['hint'] = hint
+    if game.completed:
+        state['secret'] = game.secret_number
+    return state
+
+def get_own_game(game_id):
+    """Load a game for the current user, or return an error response"""
+    game = load_game(game_id)
+    if game.user_id != current_user.id:
+        return None, error_response(403, 'You cannot access this game')
+    return game, None
+
+@bp.route('/game/start', methods=['POST'])
+def start_game():
+    """Start a new game and return its initial state"""
+    data = request.get_json(silent=True) or request.form
+    level = data.get('level', 'easy')
+    if level not in levels.active():
+        return error_response(400, 'Invalid level')
+
+    game = create_game(current_user.id, new_game_fields(level))
+    return jsonify(game_state(game)), 201
+
+@bp.route('/game/<int:game_id>')
+def game_detail(game_id):
+    """Return the current state of a game"""
+    game, error = get_own_game(game_id)
+    if error:
+        return error
+    return jsonify(game_state(game))
+
+@bp.route('/game/<int:game_id>/guess', methods=['POST'])
+def guess(game_id):
+    """Apply one guess and return the hint with the updated state"""
+    game, error = get_own_game(game_id)
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or request.form
+    try:
+        guess_val = int(data.get('guess'))
+    except (ValueError, TypeError):
+        return error_response(400, 'Please enter a valid number')
+
+    # Retries with the same key return the original result
+    client_key = request.headers.get('Idempotency-Key') or data.get('key')
+    try:
+        hint = submit_guess(game, guess_val, current_user, client_key=client_key)
+    except GameConflict:
+        return error_response(409, 'Game was updated by another request, please retry')
+    if hint is None:
+        return error_response(409, 'Game already finished')
+    return jsonify(game_state(game, hint))
+
+@bp.route('/game/<int:game_id>/guesses', methods=['POST'])
+def guess_batch(game_id):
+    """Apply an ordered list of guesses in one transaction
+
+    A list longer than the attempts left is rejected, and guesses after
+    the first correct one are ignored. Returns the hint for each applied
+    guess.
+    """
+    game = GameSession.query.get_or_404(game_id)
+    if game.user_id != current_user.id:
+        return error_response(403, 'You cannot access this game')
+    if game.completed:
+        return error_response(409, 'Game already finished')
+
+    data = request.get_json(silent=True) or {}
+    guesses = data.get('guesses')
+    if not isinstance(guesses, list) or not guesses:
+        return error_response(400, 'Expected a non-empty list of guesses')
+    if len(guesses) > game.attempts_left:
+        return error_response(400, f'At most {game.attempts_left} guesses are left')
+    # Whole numbers only: no floats, numeric strings or booleans
+    if any(type(value) is not int for value in guesses):
+        return error_response(400, 'Please enter valid numbers')
+
+    try:
+        game, applied = submit_guesses(game.id, guesses, current_user)
+    except GameConflict:
+        return error_response(409, 'Game was updated by another request, please retry')
+    state = game_state(game)
+    state['guesses'] = [
+        {'guess': guess_val, 'hint': hint} for guess_val, hint in applied
+    ]
+    return jsonify(state)
+
+@bp.route('/game/<int:game_id>/quit', methods=['POST'])
+def quit_game(game_id):
+    """End an unfinished game"""
+    game = GameSession.query.get_or_404(game_id)
+    if game.user_id != current_user.id:
+        return error_response(403, 'You cannot access this game')
+    if game.completed:
+        return error_response(409, 'Game already finished')
+
+    try:
+        end_game(game)
+    except GameConflict:
+        return error_response(409, 'Game was updated by another request, please retry')
+    return jsonify(game_state(game))
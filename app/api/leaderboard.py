@@ -0,0 +1,112 @@
+"""Paginated leaderboards as JSON.
+
+Pages are keyset-paginated on (score, id): the ``next`` cursor names the
+last row returned, and the following page starts strictly below it on the
+index, so page 1000 costs the same as page 1 and rows never shift between
+pages the way OFFSET pages do.
+"""
+from flask import current_app, jsonify, request
+
+from app import db
+from app.api import bp, public
+from app.api.errors import error_response
+from app.game.levels import levels
+from app.models import GameSession, User
+
+MAX_PAGE_SIZE = 100
+
+
+def parse_cursor(cursor):
+    """Return the (score, id) a cursor points at, or None if it is invalid"""
+    try:
+        score, row_id = cursor.split('.')
+        return int(score), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def page_response(rows, limit, item):
+    """Build a page of ``item(row)`` with the cursor of its last row.
+
+    ``rows`` holds up to ``limit + 1`` rows; the extra one only tells
+    whether there is a next page.
+    """
+    more = len(rows) > limit
+    rows = rows[:limit]
+    response = jsonify({
+        'items': [item(row) for row in rows],
+        'next': f'{rows[-1].score}.{rows[-1].id}' if more else None
+    })
+    # A content hash is enough: the page is cheap to build but often unchanged
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def page_args():
+    """Return (limit, after) from the query string, or an error response"""
+    limit = request.args.get('limit', current_app.config.get('LEADERBOARD_API_PAGE_SIZE', 20), type=int)
+    if limit < 1:
+        return None, error_response(400, 'limit must be positive')
+    after = request.args.get('after')
+    if after is not None:
+        after = parse_cursor(after)
+        if after is None:
+            return None, error_response(400, 'Invalid cursor')
+    return (min(limit, MAX_PAGE_SIZE), after), None
+
+
+@bp.route('/leaderboard')
+@public
+def leaderboard_players():
+    """Players by best score, best first"""
+    args, error = page_args()
+    if error:
+        return error
+    limit, after = args
+
+    query = db.select(User.id, User.username, User.best_score.label('score')).where(
+        User.best_score > 0
+    )
+    if after is not None:
+        query = query.where(db.tuple_(User.best_score, User.id) < after)
+    rows = db.session.execute(
+        query.order_by(User.best_score.desc(), User.id.desc()).limit(limit + 1)
+    ).all()
+    return page_response(rows, limit, lambda row: {
+        'username': row.username,
+        'score': row.score
+    })
+
+
+@bp.route('/leaderboard/<level>')
+@public
+def leaderboard_level(level):
+    """Won games of one level by score, best first"""
+    # Not levels.get(): the daily challenge has its own per-day board
+    if level not in levels.all():
+        return error_response(404, 'Unknown level')
+    args, error = page_args()
+    if error:
+        return error
+    limit, after = args
+
+    query = db.select(
+        GameSession.id, GameSession.score, GameSession.level, User.username
+    ).join(
+        User, User.id == GameSession.user_id
+    ).where(
+        GameSession.level == level,
+        GameSession.won == True
+    )
+    if after is not None:
+        query = query.where(db.tuple_(GameSession.score, GameSession.id) < after)
+    rows = db.session.execute(
+        query.order_by(GameSession.score.desc(), GameSession.id.desc()).limit(limit + 1)
+    ).all()
+    return page_response(rows, limit, lambda row: {
+        'username': row.username,
+        'score': row.score,
+        'level': row.level
+    })
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('auth', __name__)
 
-from app.auth import routes
\ No newline at end of file
+from app.auth import identity, routes
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Username and email availability checks for live form validation.
+
+Each worker keeps a Bloom filter of every taken username and email. A value
+the filter has never seen is certainly not in this worker's copy, so most
+"available" answers cost no query; only values the filter may contain are
+confirmed against the users table. Registrations in this worker are added as
+soon as they commit, and the filter is rebuilt every
+``AVAILABILITY_FILTER_TTL`` seconds to pick up other workers' registrations
+and deleted users. The answer is only advisory: registration itself relies
+on the unique constraints.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from flask import flash
+
+from app import db
+from app.models import User
+
+FIELDS = {'username': User.username, 'email': User.email}
+
+
+def report_taken(form, user_id=None):
+    """Attach an error to whichever of the form's username and email is taken.
+
+    Call after the insert or update of user ``user_id`` failed on a unique
+    constraint.
+    """
+    query = User.query.filter(
+        (User.username == form.username.data) | (User.email == form.email.data)
+    )
+    if user_id is not None:
+        query = query.filter(User.id != user_id)
+    taken = query.all()
+    if any(user.username == form.username.data for user in taken):
+        form.username.errors.append('Username already taken. Please choose a different one.')
+    if any(user.email == form.email.data for user in taken):
+        form.email.errors.append('Email already registered. Please use a different one.')
+    if not taken:
+        flash('Username or email already exists', 'danger')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        # Double hashing: the i-th position is h1 + i * h2
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+def _key(field, value):
+    return f'{field}:{value}'
+
+
+class TakenNames:
+    """Per-worker filter of taken usernames and emails"""
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self.filter_hits = 0
+        self.queries = 0
+        self._filter = None
+        self._loaded_at = 0
+        self._load_lock = threading.Lock()
+        self._add_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('AVAILABILITY_FILTER_TTL', 300)
+        app.extensions['taken_names'] = self
+
+    def is_available(self, field, value):
+        """Return True if no user has ``value`` as their ``field``"""
+        if _key(field, value) not in self._current():
+            self.filter_hits += 1
+            return True
+        self.queries += 1
+        column = FIELDS[field]
+        return not db.session.execute(
+            db.select(User.id).where(column == value).limit(1)
+        ).first()
+
+    def add(self, username, email):
+        """Mark a newly registered user's username and email as taken"""
+        bloom = self._filter
+        if bloom is not None:
+            with self._add_lock:
+                bloom.add(_key('username', username))
+                bloom.add(_key('email', email))
+
+    def invalidate(self):
+        self._loaded_at = 0
+
+    def _current(self):
+        bloom = self._filter
+        if bloom is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return bloom
+        # One request rebuilds; the others keep using the old filter
+        if self._load_lock.acquire(blocking=bloom is None):
+            try:
+                if self._filter is None or time.monotonic() - self._loaded_at >= self.ttl:
+                    self._filter = self._load()
+                    self._loaded_at = time.monotonic()
+            finally:
+                self._load_lock.release()
+        return self._filter
+
+    def _load(self):
+        count = db.session.execute(db.select(db.func.count(User.id))).scalar()
+        # Two entries per user, with room for growth until the next rebuild
+        bloom = BloomFilter(max(1024, 4 * count))
+        rows = db.session.execute(
+            db.select(User.username, User.email).execution_options(yield_per=5000)
+        )
+        for username, email in rows:
+            bloom.add(_key('username', username))
+            bloom.add(_key('email', email))
+        return bloom
+
+
+taken_names = TakenNames()
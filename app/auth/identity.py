@@ -0,0 +1,107 @@
+"""Cached identities for Flask-Login.
+
+Most pages only need the signed-in user's id, username and admin flag, for
+the navigation bar. ``load_user`` answers from a per-worker LRU of just
+those columns, kept for ``USER_CACHE_TTL`` seconds, instead of loading the
+whole users row on every request. Any other attribute, such as statistics,
+relationships or methods, loads the full User row on first use in the
+request.
+
+Admin changes to a user invalidate this worker's entry once they commit;
+other workers pick them up when their entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask_login import UserMixin
+
+from app import db, login_manager
+from app.models import User
+
+IdentityRow = namedtuple('IdentityRow', 'id username is_admin is_active')
+
+
+class Identity(UserMixin):
+    """The signed-in user as seen by ``current_user``"""
+
+    def __init__(self, row):
+        self.id = row.id
+        self.username = row.username
+        self.is_admin = bool(row.is_admin)
+        self.active = row.is_active is not False
+        self._user = None
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def __getattr__(self, name):
+        # Only reached for attributes the cached row does not have
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+            if self._user is None:
+                raise AttributeError(name)
+        return getattr(self._user, name)
+
+
+class IdentityCache:
+    """Per-worker LRU of IdentityRow by user id"""
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.size = 1024
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.size = app.config.get('USER_CACHE_SIZE', 1024)
+        app.extensions['user_identities'] = self
+
+    def get(self, user_id):
+        """Return the user's IdentityRow, or None if there is no such user"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generation
+
+        row = db.session.execute(
+            db.select(User.id, User.username, User.is_admin, User.is_active)
+                .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        row = IdentityRow(*row)
+
+        with self._lock:
+            # Skip caching a row read before an invalidation finished
+            if generation == self._generation:
+                self._entries[user_id] = (now, row)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return row
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+
+user_identities = IdentityCache()
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    """Flask-Login user loader callback"""
+    row = user_identities.get(int(user_id))
+    return Identity(row) if row is not None else None
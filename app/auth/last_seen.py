@@ -0,0 +1,117 @@
+"""Coalesced writes of users.last_seen.
+
+Every authenticated request calls ``last_seen.touch``, which only records
+the time in memory, and not even that if the user was already recorded in
+the last ``LAST_SEEN_GRANULARITY`` seconds. A background thread writes the
+recorded times every ``LAST_SEEN_FLUSH_INTERVAL`` seconds as executemany
+UPDATE batches of ``LAST_SEEN_BATCH`` rows, one writer unit each, so page
+views never take the database write lock. Pending times are flushed
+again when the process exits.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import User
+from app.writer import writer
+
+
+class LastSeenTracker:
+    """Per-process buffer of users' latest activity"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pending = {}
+        self._recorded = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.granularity = timedelta(seconds=app.config.get('LAST_SEEN_GRANULARITY', 60))
+        self.flush_interval = app.config.get('LAST_SEEN_FLUSH_INTERVAL', 30)
+        self.batch_size = app.config.get('LAST_SEEN_BATCH', 500)
+        app.extensions['last_seen'] = self
+        atexit.register(self._flush_on_exit)
+
+    def touch(self, user_id, now=None):
+        """Record that the user was active at ``now``"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            recorded = self._recorded.get(user_id)
+            if recorded is not None and now - recorded < self.granularity:
+                return
+            self._recorded[user_id] = now
+            self._pending[user_id] = now
+        self._ensure_flusher()
+
+    def flush(self):
+        """Write every pending time and return how many users were updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            # Older entries would not suppress a write any more
+            cutoff = datetime.utcnow() - self.granularity
+            self._recorded = {
+                user_id: seen for user_id, seen in self._recorded.items()
+                if seen >= cutoff
+            }
+
+        rows = [{'user_id': user_id, 'seen': seen} for user_id, seen in pending.items()]
+        for start in range(0, len(rows), self.batch_size):
+            try:
+                writer.run(store_last_seen, rows[start:start + self.batch_size])
+            except Exception:
+                with self._lock:
+                    for row in rows[start:]:
+                        self._pending.setdefault(row['user_id'], row['seen'])
+                raise
+        return len(rows)
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='last-seen-flusher',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Last seen flush failed')
+                finally:
+                    db.session.remove()
+
+    def _flush_on_exit(self):
+        if not self._pending:
+            return
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Last seen flush on exit failed')
+
+
+def store_last_seen(rows):
+    """Write unit: set last_seen from ``rows`` of user_id and seen"""
+    users = User.__table__
+    # A Core statement, so users deleted meanwhile are simply not matched
+    stmt = db.update(users).where(
+        users.c.id == db.bindparam('user_id')
+    ).values(last_seen=db.bindparam('seen'))
+    db.session.execute(stmt, rows)
+
+
+last_seen = LastSeenTracker()
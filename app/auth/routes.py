@@ -1,13 +1,13 @@
-from flask import render_template, redirect, url_for, flash, request, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
-from sqlalchemy.exc import OperationalError, IntegrityError
+from sqlalchemy.exc import IntegrityError
 from app import db
+from app.auth.availability import FIELDS, report_taken, taken_names
 from app.auth.forms import LoginForm, RegistrationForm
 from app.models import User
 from app.auth import bp
-import random
-import time
+from app.passwords import HasherBusy, password_hasher
+from app.writer import writer
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -17,72 +17,76 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                # Upgrade hashes made under an older policy while we have the password
+                writer.run(store_password_hash, user.id, password_hasher.hash(form.password.data))
+        except HasherBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.', 'warning')
+            return render_template('auth/login.html', form=form), 503
+        if valid:
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             return redirect(next_page or url_for('game.select_level'))
         flash('Invalid email or password', 'danger')
     return render_template('auth/login.html', form=form)
 
+def create_user(username, email, password_hash):
+    """Write unit: add a new account and return its id"""
+    user = User(username=username, email=email, password_hash=password_hash)
+    db.session.add(user)
+    db.session.flush()
+    return user.id
+
+def store_password_hash(user_id, password_hash):
+    """Write unit: replace a user's password hash"""
+    db.session.get(User, user_id).password_hash = password_hash
+
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
-    """Handle new user registration with retry logic for database locks"""
+    """Handle new user registration"""
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     
     form = RegistrationForm()
     if form.validate_on_submit():
-        # Check for existing user first (without db lock)
-        existing_user = User.query.filter_by(username=form.username.data).first()
-        existing_email = User.query.filter_by(email=form.email.data).first()
-        
-        if existing_user:
-            flash('Username already taken', 'danger')
+        try:
+            password_hash = password_hasher.hash(form.password.data)
+        except HasherBusy:
+            flash('Too many people are signing up right now. Please try again in a moment.', 'warning')
+            return render_template('auth/register.html', form=form), 503
+
+        try:
+            writer.run(create_user, form.username.data, form.email.data, password_hash)
+        except IntegrityError:
+            # The unique constraints are the only uniqueness check
+            report_taken(form)
             return render_template('auth/register.html', form=form)
-        if existing_email:
-            flash('Email already registered', 'danger')
+        except Exception as e:
+            current_app.logger.error(f'Registration error: {str(e)}')
+            flash('Error creating account. Please try again.', 'danger')
             return render_template('auth/register.html', form=form)
-
-        # Configure retry parameters
-        max_attempts = 5
-        base_delay = 0.1  # seconds
-        
-        for attempt in range(max_attempts):
-            try:
-                user = User(
-                    username=form.username.data,
-                    email=form.email.data
-                )
-                user.set_password(form.password.data)
-                db.session.add(user)
-                db.session.commit()
-                
-                flash('Registration successful! Please login.', 'success')
-                return redirect(url_for('auth.login'))
-                
-            except OperationalError as e:
-                db.session.rollback()
-                current_app.logger.warning(f'Database operation failed (attempt {attempt + 1}): {str(e)}')
-                
-                # Exponential backoff with jitter
-                delay = min((base_delay * (2 ** attempt)) + random.uniform(0, 0.1), 2)
-                time.sleep(delay)
-                
-            except IntegrityError:
-                db.session.rollback()
-                flash('Username or email already exists', 'danger')
-                return render_template('auth/register.html', form=form)
-                
-            except Exception as e:
-                db.session.rollback()
-                current_app.logger.error(f'Registration error: {str(e)}')
-                flash('Error creating account. Please try again.', 'danger')
-                return render_template('auth/register.html', form=form)
         
-        flash('Database is busy. Please try again later.', 'warning')
+        taken_names.add(form.username.data, form.email.data)
+        flash('Registration successful! Please login.', 'success')
+        return redirect(url_for('auth.login'))
     
     return render_template('auth/register.html', title='Register', form=form)
 
+@bp.route('/register/available')
+def check_available():
+    """Tell the registration form whether a username or email is still free"""
+    for field in FIELDS:
+        value = request.args.get(field, '').strip()
+        if value:
+            return jsonify({
+                'field': field,
+                'value': value,
+                'available': taken_names.is_available(field, value)
+            })
+    return jsonify({'error': 'Expected a username or email'}), 400
+
 @bp.route('/logout')
 @login_required
 def logout():
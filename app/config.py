@@ -32,6 +32,93 @@ class Config:
             'pool_recycle': 1800   # Recycle connections every 30 minutes for PostgreSQL
         }
     
+    # Number of reverse proxies in front of the app whose X-Forwarded-For/-Proto/-Host
+    # headers are trusted. Set it only behind a proxy: otherwise clients could forge
+    # their address and get a fresh rate-limit bucket with every request
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+    
+    # Admission control - per-worker token buckets keyed by the signed-in user, or the
+    # IP address for guests, as "requests/seconds" ('' disables a budget). Form posts
+    # and API writes are charged, and clients over budget get 429. Past
+    # MAX_CONCURRENT_REQUESTS requests in flight a worker answers 503 straight away
+    # instead of queueing for a connection (0 = no cap).
+    RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '20/60')
+    RATE_LIMIT_REGISTER = os.environ.get('RATE_LIMIT_REGISTER', '10/600')
+    RATE_LIMIT_PLAY = os.environ.get('RATE_LIMIT_PLAY', '120/60')  # Games started, guesses and quits, web, API and races
+    RATE_LIMIT_FEEDBACK = os.environ.get('RATE_LIMIT_FEEDBACK', '10/600')
+    RATE_LIMIT_AVAILABILITY = os.environ.get('RATE_LIMIT_AVAILABILITY', '30/60')  # Live username/email checks, charged on every lookup
+    RATE_LIMIT_CLIENTS = int(os.environ.get('RATE_LIMIT_CLIENTS', 10000))  # Buckets kept per worker, least recently used dropped first
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 15))  # pool_size + max_overflow
+    
+    # Active game store - keep in-progress games in memory and write guesses
+    # to the database in batches. Each game lives in the worker that loaded it,
+    # so enable only with a single worker or sticky sessions.
+    ACTIVE_GAME_STORE = os.environ.get('ACTIVE_GAME_STORE', 'False').lower() in ('true', '1', 't')
+    ACTIVE_GAME_FLUSH_INTERVAL = float(os.environ.get('ACTIVE_GAME_FLUSH_INTERVAL', 5))  # Max seconds of guesses lost on a crash
+    ACTIVE_GAME_FLUSH_BATCH = int(os.environ.get('ACTIVE_GAME_FLUSH_BATCH', 20))  # Flush a game early once this many guesses are pending
+    ACTIVE_GAME_IDLE_TIMEOUT = int(os.environ.get('ACTIVE_GAME_IDLE_TIMEOUT', 1800))  # Drop idle games from memory after this many seconds
+    
+    # Abandoned games - open games with no activity for GAME_ABANDON_AFTER seconds are
+    # completed by `flask reap-games`, or every GAME_REAPER_INTERVAL seconds if set (0 disables)
+    GAME_ABANDON_AFTER = int(os.environ.get('GAME_ABANDON_AFTER', 86400))
+    GAME_REAPER_INTERVAL = int(os.environ.get('GAME_REAPER_INTERVAL', 0))
+    GAME_REAPER_BATCH = int(os.environ.get('GAME_REAPER_BATCH', 500))  # Games completed per UPDATE
+    
+    # Level rules are cached per worker; changes made in another worker show up after this many seconds
+    LEVEL_SETTINGS_TTL = int(os.environ.get('LEVEL_SETTINGS_TTL', 60))
+    
+    # Rows kept on each materialized leaderboard (top players, recent winners, each level)
+    LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', 10))
+    LEADERBOARD_CACHE_TTL = int(os.environ.get('LEADERBOARD_CACHE_TTL', 30))  # Seconds a worker reuses its cached boards
+    RANK_INDEX_TTL = int(os.environ.get('RANK_INDEX_TTL', 600))  # Seconds before a worker reloads player ranks
+    LEADERBOARD_API_PAGE_SIZE = int(os.environ.get('LEADERBOARD_API_PAGE_SIZE', 20))  # Default page size of /api/leaderboard (at most 100)
+    
+    # Daily challenge - the secret is derived from this seed (defaults to SECRET_KEY) and the UTC date
+    DAILY_CHALLENGE_SEED = os.environ.get('DAILY_CHALLENGE_SEED')
+    DAILY_LEADERBOARD_SIZE = int(os.environ.get('DAILY_LEADERBOARD_SIZE', 10))
+    DAILY_LEADERBOARD_TTL = int(os.environ.get('DAILY_LEADERBOARD_TTL', 15))  # Seconds a worker reuses its cached board
+    
+    # Multiplayer races - rooms live in memory in the worker that created them,
+    # so enable sticky sessions when running more than one worker
+    RACE_MAX_PLAYERS = int(os.environ.get('RACE_MAX_PLAYERS', 8))
+    RACE_ROOM_TIMEOUT = int(os.environ.get('RACE_ROOM_TIMEOUT', 900))  # Finish and drop rooms idle for this many seconds
+    
+    # Server-sent event streams
+    SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 15))  # Seconds between keep-alive comments
+    SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 100))  # Events buffered per client before it is dropped
+    LEADERBOARD_STREAM_INTERVAL = int(os.environ.get('LEADERBOARD_STREAM_INTERVAL', 5))  # Seconds between checks for other workers' wins
+    LEADERBOARD_STREAM_CLIENTS = int(os.environ.get('LEADERBOARD_STREAM_CLIENTS', 500))  # Live leaderboard listeners per worker
+    
+    # Signed-in user identity (id, username, admin flag) cached per worker
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # Seconds before other workers see admin changes
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    
+    # Password hashing - any werkzeug method; older hashes are upgraded at login.
+    # Hashes run in a per-worker process pool (0 = inline on the request thread),
+    # and logins fail fast with 503 once PASSWORD_HASH_QUEUE hashes are pending.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # Seconds before a queued hash counts as busy
+    
+    # Seconds before a worker rebuilds its filter of taken usernames and emails
+    AVAILABILITY_FILTER_TTL = int(os.environ.get('AVAILABILITY_FILTER_TTL', 300))
+    
+    # users.last_seen is written in batches, at most once per granularity per user
+    LAST_SEEN_GRANULARITY = int(os.environ.get('LAST_SEEN_GRANULARITY', 60))  # Seconds
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', 30))  # Seconds between batch writes
+    LAST_SEEN_BATCH = int(os.environ.get('LAST_SEEN_BATCH', 500))  # Users per UPDATE batch
+    
+    # SQLite only: request writes are queued to one writer thread per worker, which
+    # commits up to SQLITE_WRITER_BATCH of them together, instead of every request
+    # thread contending for the database lock
+    SQLITE_SINGLE_WRITER = os.environ.get('SQLITE_SINGLE_WRITER', 'True').lower() in ('true', '1', 't')
+    SQLITE_WRITER_BATCH = int(os.environ.get('SQLITE_WRITER_BATCH', 64))
+    SQLITE_WRITER_TIMEOUT = float(os.environ.get('SQLITE_WRITER_TIMEOUT', 30))  # Seconds a request waits for its write
+    
+    # Guest practice games live in a signed session token and expire after this many seconds
+    PRACTICE_TOKEN_MAX_AGE = int(os.environ.get('PRACTICE_TOKEN_MAX_AGE', 86400))
+    
     # Disable modification tracking
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
@@ -2,6 +2,11 @@ from flask import Blueprint, render_template
 
 bp = Blueprint('errors', __name__)
 
+def retry_headers(error):
+    """Pass on the Retry-After hint of a 429 or 503"""
+    retry_after = getattr(error, 'retry_after', None)
+    return {'Retry-After': str(retry_after)} if retry_after else {}
+
 @bp.app_errorhandler(404)
 def error_404(error):
     return render_template('errors/404.html'), 404
@@ -12,4 +17,12 @@ def error_403(error):
 
 @bp.app_errorhandler(500)
 def error_500(error):
-    return render_template('errors/500.html'), 500
\ No newline at end of file
+    return render_template('errors/500.html'), 500
+
+@bp.app_errorhandler(429)
+def error_429(error):
+    return render_template('errors/429.html'), 429, retry_headers(error)
+
+@bp.app_errorhandler(503)
+def error_503(error):
+    return render_template('errors/503.html'), 503, retry_headers(error)
\ No newline at end of file
@@ -18,4 +18,13 @@ LEVEL_SETTINGS = {
         'multiplier': 3,
         'points_per_attempt': 20
     }
-}
\ No newline at end of file
+}
+
+# Daily challenge: one secret number per UTC day, shared by every player
+DAILY_LEVEL = 'daily'
+DAILY_CHALLENGE = {
+    'range': (1, 100),
+    'attempts': 7,
+    'multiplier': 3,
+    'points_per_attempt': 20
+}
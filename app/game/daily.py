@@ -0,0 +1,122 @@
+"""Daily challenge: one shared secret number per UTC day.
+
+The secret is derived from ``DAILY_CHALLENGE_SEED`` and the date, so every
+worker computes the same puzzle without storing it. Each winning challenge
+game adds a DailyScore row in the same transaction that finishes it, and
+the day's top scores are cached per worker for ``DAILY_LEADERBOARD_TTL``
+seconds. Viewing the board is a dictionary lookup; a refresh reads at most
+``DAILY_LEADERBOARD_SIZE`` rows from the (day, score) index, never game_sessions.
+"""
+import hashlib
+import hmac
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app
+
+from app import db
+from app.game.constants import DAILY_CHALLENGE, DAILY_LEVEL
+from app.models import DailyScore, GameSession, User
+from app.utils import after_commit
+
+
+def challenge_day(moment=None):
+    """Return the UTC date a challenge started at ``moment`` belongs to"""
+    return (moment or datetime.utcnow()).date()
+
+
+@lru_cache(maxsize=16)
+def _secret_for(seed, day):
+    digest = hmac.new(seed.encode(), day.isoformat().encode(), hashlib.sha256).digest()
+    low, high = DAILY_CHALLENGE['range']
+    return low + int.from_bytes(digest[:8], 'big') % (high - low + 1)
+
+
+def daily_secret(day):
+    """Return the secret number for ``day``, the same in every worker"""
+    seed = current_app.config.get('DAILY_CHALLENGE_SEED') or current_app.config['SECRET_KEY']
+    return _secret_for(seed, day)
+
+
+def new_daily_fields(day):
+    """Return the initial GameSession column values for ``day``'s challenge"""
+    low, high = DAILY_CHALLENGE['range']
+    return dict(
+        level=DAILY_LEVEL,
+        daily_day=day,
+        secret_number=daily_secret(day),
+        attempts_left=DAILY_CHALLENGE['attempts'],
+        current_range_low=low,
+        current_range_high=high
+    )
+
+
+def todays_game(user_id, day):
+    """Return the player's challenge game for ``day``, if they started one"""
+    return GameSession.query.filter_by(user_id=user_id, daily_day=day).one_or_none()
+
+
+def record_score(user_id, game):
+    """Add a won challenge game to its day's leaderboard.
+
+    Runs inside the transaction that finishes the game.
+    """
+    if game.level != DAILY_LEVEL or not game.won:
+        return
+    # The day whose secret the game used, even if it was stamped after midnight;
+    # only duplicate games from before challenge games were keyed have none
+    day = game.daily_day or challenge_day(game.created_at)
+    if DailyScore.query.filter_by(day=day, user_id=user_id).first():
+        return
+    db.session.add(DailyScore(
+        day=day,
+        user_id=user_id,
+        game_id=game.id,
+        score=game.score,
+        finished_at=game.end_time
+    ))
+    after_commit(daily_board.invalidate, day)
+
+
+class DailyBoard:
+    """Per-worker cache of each day's top challenge scores"""
+
+    def __init__(self):
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def top(self, day):
+        """Return (username, score, finished_at) rows for ``day``, best first"""
+        ttl = current_app.config.get('DAILY_LEADERBOARD_TTL', 15)
+        cached = self._boards.get(day)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        rows = db.session.query(
+            User.username,
+            DailyScore.score,
+            DailyScore.finished_at
+        ).join(
+            User, User.id == DailyScore.user_id
+        ).filter(
+            DailyScore.day == day
+        ).order_by(
+            DailyScore.score.desc(),
+            DailyScore.finished_at
+        ).limit(current_app.config.get('DAILY_LEADERBOARD_SIZE', 10)).all()
+
+        with self._lock:
+            self._boards[day] = (time.monotonic(), rows)
+            # Keep only today's and yesterday's boards
+            for old_day in sorted(self._boards)[:-2]:
+                del self._boards[old_day]
+        return rows
+
+    def invalidate(self, day):
+        with self._lock:
+            self._boards.pop(day, None)
+
+
+daily_board = DailyBoard()
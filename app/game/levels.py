@@ -0,0 +1,126 @@
+"""Process-wide registry of game level rules.
+
+Gameplay, scoring and the admin pages all read level rules from one
+immutable snapshot: the ``LEVEL_SETTINGS`` defaults overlaid with any rows
+in the Setting table. Admin changes are written through the registry, which
+bumps its version so the next read rebuilds the snapshot. Other worker
+processes pick the change up once their snapshot is older than
+``LEVEL_SETTINGS_TTL`` seconds, so reads cost no database query in between.
+"""
+import hashlib
+import threading
+import time
+from types import MappingProxyType
+
+from app import db
+from app.game.constants import DAILY_CHALLENGE, DAILY_LEVEL, LEVEL_SETTINGS
+from app.models import Setting
+from app.utils import after_commit
+
+
+def _freeze(rules):
+    return MappingProxyType(dict(rules))
+
+
+# Levels with fixed rules that are not listed or edited with the others
+SPECIAL_LEVELS = MappingProxyType({
+    DAILY_LEVEL: _freeze(dict(DAILY_CHALLENGE, is_active=True))
+})
+
+
+class LevelRegistry:
+    """Cached, versioned view of the rules for every level"""
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.version = 0
+        self._snapshot = None
+        self._snapshot_version = None
+        self._loaded_at = 0
+        self.stamp = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LEVEL_SETTINGS_TTL', 60)
+        app.extensions['levels'] = self
+
+    def all(self):
+        """Return a read-only mapping of level name to rules"""
+        snapshot = self._snapshot
+        if (snapshot is None
+                or self._snapshot_version != self.version
+                or time.monotonic() - self._loaded_at > self.ttl):
+            snapshot = self._reload()
+        return snapshot
+
+    def get(self, level):
+        """Return the rules for ``level``, or None if it does not exist"""
+        return self.all().get(level) or SPECIAL_LEVELS.get(level)
+
+    def active(self):
+        """Return only the levels players can currently start"""
+        return MappingProxyType({
+            level: rules for level, rules in self.all().items()
+            if rules['is_active']
+        })
+
+    def setting(self, level):
+        """Return the Setting row for ``level`` to edit, creating it if needed.
+
+        Edit it inside a writer unit that also calls publish().
+        """
+        setting = Setting.query.filter_by(level=level).first()
+        if setting is None:
+            defaults = LEVEL_SETTINGS.get(level, LEVEL_SETTINGS['easy'])
+            setting = Setting(
+                level=level,
+                range_low=defaults['range'][0],
+                range_high=defaults['range'][1],
+                max_attempts=defaults['attempts'],
+                score_multiplier=defaults['multiplier'],
+                is_active=True
+            )
+            db.session.add(setting)
+        return setting
+
+    def publish(self):
+        """Invalidate the snapshot once the current transaction commits"""
+        after_commit(self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def _reload(self):
+        with self._lock:
+            version = self.version
+            rules = {
+                level: dict(defaults, is_active=True)
+                for level, defaults in LEVEL_SETTINGS.items()
+            }
+            for setting in Setting.query.all():
+                level_rules = rules.setdefault(
+                    setting.level,
+                    dict(LEVEL_SETTINGS['easy'], is_active=True)
+                )
+                level_rules.update(
+                    range=(setting.range_low, setting.range_high),
+                    attempts=setting.max_attempts,
+                    multiplier=setting.score_multiplier,
+                    is_active=bool(setting.is_active)
+                )
+            snapshot = MappingProxyType({
+                level: _freeze(level_rules) for level, level_rules in rules.items()
+            })
+            self._snapshot = snapshot
+            self.stamp = hashlib.sha1(
+                repr(sorted((level, sorted(r.items())) for level, r in rules.items())).encode()
+            ).hexdigest()[:12]
+            self._snapshot_version = version
+            self._loaded_at = time.monotonic()
+        return snapshot
+
+
+levels = LevelRegistry()
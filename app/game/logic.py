@@ -0,0 +1,288 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import db
+from app.game import daily
+from app.game.constants import DAILY_LEVEL
+from app.game.levels import levels
+from app.game.store import ActiveGame, active_games
+from app.leaderboard import boards
+from app.models import GameSession, Guess, User
+from app.writer import writer
+
+
+class GameConflict(Exception):
+    """Raised when a concurrent request changed the game first"""
+
+
+def new_game_fields(level):
+    """Return the initial column values for a new game at ``level``."""
+    rules = levels.get(level)
+    min_num, max_num = rules['range']
+    return dict(
+        level=level,
+        secret_number=random.randint(min_num, max_num),
+        attempts_left=rules['attempts'],
+        current_range_low=min_num,
+        current_range_high=max_num
+    )
+
+
+def touch_player(user_id):
+    """Bump the player's stats version so cached profile pages revalidate."""
+    db.session.execute(
+        db.update(User)
+            .where(User.id == user_id)
+            .values(stats_version=User.stats_version + 1)
+            .execution_options(synchronize_session=False)
+    )
+
+
+def insert_game(user_id, fields):
+    """Write unit: add a new GameSession for the player and return its id."""
+    game = GameSession(user_id=user_id, **fields)
+    db.session.add(game)
+    touch_player(user_id)
+    db.session.flush()
+    return game.id
+
+
+def create_game(user_id, fields):
+    """Start and commit a new GameSession for the player."""
+    return db.session.get(GameSession, writer.run(insert_game, user_id, fields))
+
+
+def start_daily_game(user_id, day):
+    """Return the player's challenge game for ``day``, starting it if needed."""
+    try:
+        game_id = writer.run(insert_daily_game, user_id, day)
+    except IntegrityError:
+        # A concurrent request started it first
+        return daily.todays_game(user_id, day)
+    return db.session.get(GameSession, game_id)
+
+
+def insert_daily_game(user_id, day):
+    """Write unit: add the player's challenge game for ``day`` unless it exists; return its id."""
+    game = daily.todays_game(user_id, day)
+    if game is not None:
+        return game.id
+    return insert_game(user_id, daily.new_daily_fields(day))
+
+
+def apply_guess(game, guess_val, rules=None):
+    """Apply one guess to ``game`` in place and return the result.
+
+    ``game`` can be a GameSession row or an ActiveGame held by the store.
+    Pass ``rules`` to score with rules captured earlier instead of the
+    current level settings. The result is one of 'correct', 'too high' or
+    'too low'.
+    """
+    if rules is None:
+        rules = levels.get(game.level) or {}
+    multiplier = rules.get('multiplier', 1)
+    points_per_attempt = rules.get('points_per_attempt', 10)
+
+    game.attempts_left -= 1
+
+    if guess_val == game.secret_number:
+        game.score = int(game.attempts_left * points_per_attempt * multiplier)
+        game.completed = True
+        game.won = True
+        game.end_time = datetime.utcnow()
+        return 'correct'
+
+    if guess_val > game.secret_number:
+        result = 'too high'
+        game.current_range_high = min(game.current_range_high, guess_val - 1)
+    else:
+        result = 'too low'
+        game.current_range_low = max(game.current_range_low, guess_val + 1)
+
+    if game.attempts_left <= 0:
+        game.completed = True
+        game.end_time = datetime.utcnow()
+    return result
+
+
+def record_result(user_id, game):
+    """Add a finished game to the player's statistics and leaderboards.
+
+    Uses a single conditional UPDATE so concurrent games for the same
+    player cannot overwrite each other's counters. A daily challenge game
+    counts as played and won, but its score only goes on the day's board.
+    """
+    values = {
+        'games_played': User.games_played + 1,
+        'stats_version': User.stats_version + 1
+    }
+    if game.won:
+        values['games_won'] = User.games_won + 1
+    if game.won and game.level != DAILY_LEVEL:
+        values['best_score'] = db.case(
+            (User.best_score < game.score, game.score),
+            else_=User.best_score
+        )
+    db.session.execute(
+        db.update(User)
+            .where(User.id == user_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+    )
+    if game.level == DAILY_LEVEL:
+        daily.record_score(user_id, game)
+    else:
+        boards.record_game(user_id, game)
+
+
+@contextmanager
+def game_transaction():
+    """Turn lost update races in the enclosed writes into GameConflict."""
+    try:
+        yield
+    except (StaleDataError, IntegrityError):
+        raise GameConflict()
+
+
+def load_game(game_id):
+    """Return the game to play, preferring the active-game store copy."""
+    game = active_games.get(game_id) if active_games.enabled else None
+    return game or GameSession.query.get_or_404(game_id)
+
+
+def submit_guess(game, guess_val, user, client_key=None):
+    """Apply and persist a guess, returning its result.
+
+    ``client_key`` makes retries safe: a guess already recorded under the
+    same key is not applied again and its original result is returned.
+    Games held by the active-game store only hit the database when their
+    pending batch is full or the game finishes. Returns None if the game
+    is already finished, and raises GameConflict if another request changed
+    the game first.
+    """
+    if isinstance(game, ActiveGame):
+        with game.lock:
+            if client_key in game.keys:
+                return game.keys[client_key]
+            if game.completed:
+                return None
+            before = (game.attempts_left, game.current_range_low, game.current_range_high)
+            result = apply_guess(game, guess_val)
+            batch_full = active_games.record(game, guess_val, result, client_key)
+            finished = game.completed
+            if finished:
+                rows = active_games.take(game)
+        if finished:
+            # Outside game.lock: units running on the writer take game locks too
+            try:
+                writer.run(finish_active_game, game, rows, user.id)
+            except Exception:
+                active_games.reopen(game, rows, before)
+                raise
+            return result
+        if batch_full:
+            active_games.flush(game.id)
+        return result
+
+    with game_transaction():
+        return writer.run(
+            record_guess, game.id, game.version, guess_val, user.id, client_key
+        )
+
+
+def record_guess(game_id, version, guess_val, user_id, client_key=None):
+    """Write unit: apply one guess to the stored game and return its result.
+
+    ``version`` is the game version the player saw; if the game has moved
+    on since, GameConflict is raised instead of applying the guess.
+    """
+    if client_key:
+        replay = Guess.query.filter_by(game_id=game_id, client_key=client_key).first()
+        if replay:
+            return replay.result
+    game = db.session.get(GameSession, game_id)
+    if game.completed:
+        return None
+    if game.version != version:
+        raise GameConflict()
+
+    result = apply_guess(game, guess_val)
+    db.session.add(Guess(
+        game_id=game.id,
+        guess_value=guess_val,
+        result=result,
+        client_key=client_key
+    ))
+    if game.completed:
+        record_result(user_id, game)
+    db.session.flush()
+    return result
+
+
+def finish_active_game(game, rows, user_id):
+    """Write unit: write a game finished in the active-game store through, with its result."""
+    active_games.finish(game, rows)
+    record_result(user_id, game)
+
+
+def submit_guesses(game_id, guess_vals, user):
+    """Apply an ordered list of guesses in one transaction.
+
+    Stops at the first correct guess or when attempts run out, writes the
+    Guess rows with a single bulk insert and updates the player's statistics
+    once. Returns the GameSession and a list of (guess, result) pairs.
+    """
+    GameSession.query.get_or_404(game_id)
+    with game_transaction():
+        applied = writer.run(record_guesses, game_id, guess_vals, user.id)
+    return db.session.get(GameSession, game_id), applied
+
+
+def record_guesses(game_id, guess_vals, user_id):
+    """Write unit: apply guesses to the stored game, returning (guess, result) pairs."""
+    # Take the game out of the active-game store so the row is authoritative
+    active_games.evict(game_id)
+    game = db.session.get(GameSession, game_id)
+    applied = []
+    rows = []
+    for guess_val in guess_vals:
+        if game.completed:
+            break
+        result = apply_guess(game, guess_val)
+        applied.append((guess_val, result))
+        rows.append({
+            'game_id': game.id,
+            'guess_value': guess_val,
+            'result': result,
+            'created_at': datetime.utcnow()
+        })
+
+    if rows:
+        db.session.execute(db.insert(Guess), rows)
+    if game.completed:
+        record_result(user_id, game)
+    db.session.flush()
+    return applied
+
+
+def end_game(game):
+    """Mark an unfinished GameSession as abandoned and commit."""
+    with game_transaction():
+        writer.run(abandon_game, game.id)
+
+
+def abandon_game(game_id):
+    """Write unit: mark a stored game as finished without a result."""
+    # Write out any guesses still held in memory first
+    active_games.evict(game_id)
+    game = db.session.get(GameSession, game_id)
+    if game.completed:
+        return
+    game.completed = True
+    game.end_time = datetime.utcnow()
+    touch_player(game.user_id)
+    db.session.flush()
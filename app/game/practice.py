@@ -0,0 +1,100 @@
+"""Stateless practice games for anonymous visitors.
+
+The whole game is kept in a token stored in the user's session cookie. The
+state is encrypted with a keystream derived from ``SECRET_KEY`` (HMAC-SHA256
+in counter mode) and then signed with itsdangerous, so the client can neither
+read the secret number nor tamper with the range or attempts. Practice games
+never touch the database. Replaying an older token only rewinds the player's
+own practice game, since nothing is recorded.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from app.game.logic import apply_guess, new_game_fields
+
+SALT = 'practice-game'
+NONCE_SIZE = 16
+
+
+class PracticeGame:
+    """Guest game state, rebuilt from and saved back to a token"""
+
+    fields = (
+        'level', 'secret_number', 'attempts_left', 'current_range_low',
+        'current_range_high', 'completed', 'won', 'score', 'guesses'
+    )
+
+    def __init__(self, **state):
+        self.completed = False
+        self.won = False
+        self.score = 0
+        self.guesses = []  # [guess, result] pairs, newest first
+        self.end_time = None
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def start(cls, level):
+        return cls(**new_game_fields(level))
+
+    def guess(self, guess_val):
+        """Apply a guess with the same rules as registered games"""
+        result = apply_guess(self, guess_val)
+        self.guesses.insert(0, [guess_val, result])
+        return result
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.fields}
+
+
+def _keystream(key, nonce, length):
+    stream = b''
+    counter = 0
+    while len(stream) < length:
+        block = nonce + counter.to_bytes(4, 'big')
+        stream += hmac.new(key, block, hashlib.sha256).digest()
+        counter += 1
+    return stream[:length]
+
+
+def _cipher_key():
+    secret = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(secret, b'practice-game-encryption', hashlib.sha256).digest()
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+def dump_game(game):
+    """Encrypt and sign a practice game into a URL-safe token"""
+    plaintext = json.dumps(game.to_dict(), separators=(',', ':')).encode()
+    nonce = os.urandom(NONCE_SIZE)
+    stream = _keystream(_cipher_key(), nonce, len(plaintext))
+    ciphertext = bytes(a ^ b for a, b in zip(plaintext, stream))
+    return _serializer().dumps(base64.urlsafe_b64encode(nonce + ciphertext).decode())
+
+
+def load_game(token):
+    """Return the PracticeGame in ``token``, or None if invalid or expired"""
+    if not token:
+        return None
+    try:
+        payload = _serializer().loads(
+            token,
+            max_age=current_app.config.get('PRACTICE_TOKEN_MAX_AGE')
+        )
+        raw = base64.urlsafe_b64decode(payload.encode())
+    except (BadSignature, ValueError, AttributeError):
+        return None
+
+    nonce, ciphertext = raw[:NONCE_SIZE], raw[NONCE_SIZE:]
+    stream = _keystream(_cipher_key(), nonce, len(ciphertext))
+    state = json.loads(bytes(a ^ b for a, b in zip(ciphertext, stream)))
+    return PracticeGame(**state)
@@ -0,0 +1,127 @@
+"""Expire games that players walked away from.
+
+A game is abandoned once nothing has happened in it, neither its start nor
+a guess, for ``GAME_ABANDON_AFTER`` seconds. The reaper marks such games
+completed (lost, like quitting) in chunks of ``GAME_REAPER_BATCH`` rows, one
+short writer unit per chunk, so it never holds long locks. Run it
+with ``flask reap-games`` from cron, or set ``GAME_REAPER_INTERVAL`` to run
+it from a background thread in each worker.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.game.store import active_games
+from app.models import GameSession, Guess, User
+from app.writer import writer
+
+
+class GameReaper:
+    """Finds abandoned open games and completes them in batches"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_idle = app.config.get('GAME_ABANDON_AFTER', 86400)
+        self.batch_size = app.config.get('GAME_REAPER_BATCH', 500)
+        self.interval = app.config.get('GAME_REAPER_INTERVAL', 0)
+        app.extensions['game_reaper'] = self
+        if self.interval > 0:
+            self.start()
+
+    def reap(self, max_idle=None, batch_size=None):
+        """Complete every abandoned game and return how many were reaped"""
+        max_idle = self.max_idle if max_idle is None else max_idle
+        batch_size = batch_size or self.batch_size
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=max_idle)
+
+        recent_guess = db.select(Guess.id).where(
+            Guess.game_id == GameSession.id,
+            Guess.created_at >= cutoff
+        ).exists()
+        # Games held by this worker's active-game store may have guesses
+        # that are not written yet
+        held = active_games.held_ids() if active_games.enabled else []
+
+        reaped = 0
+        last = None
+        while True:
+            # Walks the partial index of open games in (created_at, id) order
+            query = db.select(GameSession.id, GameSession.created_at).where(
+                GameSession.completed == False,
+                GameSession.created_at < cutoff,
+                ~recent_guess
+            )
+            if last is not None:
+                query = query.where(
+                    db.tuple_(GameSession.created_at, GameSession.id) > last
+                )
+            if held:
+                query = query.where(GameSession.id.not_in(held))
+            rows = db.session.execute(
+                query.order_by(GameSession.created_at, GameSession.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            reaped += writer.run(complete_games, [row.id for row in rows], now)
+            last = tuple(rows[-1])
+        return reaped
+
+    def start(self):
+        """Run the reaper every ``GAME_REAPER_INTERVAL`` seconds in a thread"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='game-reaper',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.app.app_context():
+                try:
+                    reaped = self.reap()
+                    if reaped:
+                        self.app.logger.info('Reaped %d abandoned games', reaped)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Game reaper failed')
+                finally:
+                    db.session.remove()
+
+
+def complete_games(ids, now):
+    """Write unit: mark the still-open games in ``ids`` abandoned; return how many"""
+    result = db.session.execute(
+        db.update(GameSession)
+            .where(GameSession.id.in_(ids), GameSession.completed == False)
+            .values(
+                completed=True,
+                end_time=now,
+                version=GameSession.version + 1
+            )
+            .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.update(User)
+            .where(User.id.in_(
+                db.select(GameSession.user_id).where(GameSession.id.in_(ids))
+            ))
+            .values(stats_version=User.stats_version + 1)
+            .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+game_reaper = GameReaper()
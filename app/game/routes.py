@@ -1,43 +1,64 @@
-import random
-from datetime import datetime
+import uuid
 
-from flask import render_template, request, flash, redirect, url_for, current_app
+from flask import render_template, request, flash, redirect, url_for, current_app, session
 from flask_login import current_user, login_required
-from sqlalchemy.orm import joinedload
 
 from app import db
-from app.game import bp
-from app.game.constants import LEVEL_SETTINGS
-from app.models import GameSession, Guess, User, Game
+from app.game import bp, daily, practice
+from app.game.constants import DAILY_LEVEL
+from app.game.levels import levels
+from app.game.logic import (GameConflict, create_game, end_game, load_game,
+                            new_game_fields, start_daily_game, submit_guess)
+from app.leaderboard import boards
+from app.leaderboard.ranks import GLOBAL, rank_index
+from app.models import GameSession
+from app.utils import conditional, not_modified
 
 @bp.route('/select-level')
 @login_required
 def select_level():
     """Render level selection page with game difficulty options."""
-    return render_template('game/select_level.html', LEVEL_SETTINGS=LEVEL_SETTINGS)
+    return render_template('game/select_level.html', LEVEL_SETTINGS=levels.active())
 
 @bp.route('/start-game', methods=['POST'])
 @login_required
 def start_game():
     """Initialize a new game session based on selected level."""
     level = request.form.get('level', 'easy')
-    if level not in LEVEL_SETTINGS:
+    if level not in levels.active():
         flash('Invalid level selected', 'danger')
         return redirect(url_for('game.select_level'))
 
-    min_num, max_num = LEVEL_SETTINGS[level]['range']
-    secret = random.randint(min_num, max_num)
+    game_session = create_game(current_user.id, new_game_fields(level))
 
-    game_session = GameSession(
-        user_id=current_user.id,
-        level=level,
-        secret_number=secret,
-        attempts_left=LEVEL_SETTINGS[level]['attempts'],
-        current_range_low=min_num,
-        current_range_high=max_num
+    return redirect(url_for('game.play', game_id=game_session.id))
+
+@bp.route('/daily')
+def daily_challenge():
+    """Show today's challenge and its leaderboard."""
+    day = daily.challenge_day()
+    game = None
+    if current_user.is_authenticated:
+        game = daily.todays_game(current_user.id, day)
+    return render_template(
+        'game/daily.html',
+        day=day,
+        game=game,
+        leaders=daily.daily_board.top(day),
+        rules=levels.get(DAILY_LEVEL)
     )
-    db.session.add(game_session)
-    db.session.commit()
+
+@bp.route('/daily/start', methods=['POST'])
+@login_required
+def start_daily():
+    """Start, or resume, the player's one challenge game for today."""
+    day = daily.challenge_day()
+    game_session = daily.todays_game(current_user.id, day)
+    if game_session is None:
+        game_session = start_daily_game(current_user.id, day)
+    elif game_session.completed:
+        flash('You have already played today\'s challenge. Come back tomorrow!', 'info')
+        return redirect(url_for('game.daily_challenge'))
 
     return redirect(url_for('game.play', game_id=game_session.id))
 
@@ -45,7 +66,7 @@ def start_game():
 @login_required
 def play(game_id):
     """Handle gameplay: display form, process guesses, and track history."""
-    game = GameSession.query.get_or_404(game_id)
+    game = load_game(game_id)
 
     # Prevent access by other users
     if game.user_id != current_user.id:
@@ -56,10 +77,8 @@ def play(game_id):
     if game.completed:
         return redirect(url_for('game.results', game_id=game.id))
 
-    # Get level settings with defaults
-    level_settings = LEVEL_SETTINGS.get(game.level, {})
-    multiplier = level_settings.get('multiplier', 1)
-    points_per_attempt = level_settings.get('points_per_attempt', 10)
+    rules = levels.get(game.level) or {}
+    multiplier = rules.get('multiplier', 1)
 
     hint = None
     if request.method == 'POST':
@@ -70,53 +89,19 @@ def play(game_id):
             flash('Please enter a valid number', 'danger')
             return redirect(url_for('game.play', game_id=game.id))
 
-        # Decrease attempt and record
-        game.attempts_left -= 1
-
-        # Correct?
-        if guess_val == game.secret_number:
-            game.score = game.attempts_left * points_per_attempt * multiplier
-            game.completed = True
-            game.won = True
-            game.end_time = datetime.utcnow()
-
-            # Update user stats
-            current_user.games_played += 1
-            current_user.games_won += 1
-            if game.score > current_user.best_score:
-                current_user.best_score = game.score
-
-            db.session.add(Guess(
-                game_id=game.id,
-                guess_value=guess_val,
-                result='correct'
-            ))
-            db.session.commit()
-            return redirect(url_for('game.results', game_id=game.id))
+        try:
+            hint = submit_guess(
+                game, guess_val, current_user,
+                client_key=request.form.get('guess_key')
+            )
+        except GameConflict:
+            flash('This game was updated by another request. Please try again.', 'warning')
+            return redirect(url_for('game.play', game_id=game.id))
 
-        # Too high / too low
-        hint = 'too high' if guess_val > game.secret_number else 'too low'
-        if hint == 'too high':
-            game.current_range_high = min(game.current_range_high, guess_val - 1)
-        else:
-            game.current_range_low = max(game.current_range_low, guess_val + 1)
-
-        db.session.add(Guess(
-            game_id=game.id,
-            guess_value=guess_val,
-            result=hint
-        ))
-
-        # Out of attempts?
-        if game.attempts_left <= 0:
-            game.completed = True
-            game.end_time = datetime.utcnow()
-            current_user.games_played += 1
-            db.session.commit()
+        # Won, out of attempts, or finished by a concurrent request
+        if game.completed:
             return redirect(url_for('game.results', game_id=game.id))
 
-        db.session.commit()
-
     # Render the play template
     return render_template(
         'game/play.html',
@@ -124,14 +109,68 @@ def play(game_id):
         hint=hint,
         range_low=game.current_range_low,
         range_high=game.current_range_high,
-        LEVEL_SETTINGS=LEVEL_SETTINGS,
-        multiplier=multiplier
+        total_attempts=rules.get('attempts', game.attempts_left),
+        multiplier=multiplier,
+        guess_key=uuid.uuid4().hex
+    )
+
+@bp.route('/practice')
+def practice_game():
+    """Show the guest practice game, or level selection if none is running."""
+    game = practice.load_game(session.get('practice'))
+    return render_template(
+        'game/practice.html',
+        game=game,
+        hint=None,
+        LEVEL_SETTINGS=levels.all()
+    )
+
+@bp.route('/practice/start', methods=['POST'])
+def start_practice():
+    """Start a guest practice game held entirely in the session cookie."""
+    level = request.form.get('level', 'easy')
+    if level not in levels.active():
+        flash('Invalid level selected', 'danger')
+        return redirect(url_for('game.practice_game'))
+
+    session['practice'] = practice.dump_game(practice.PracticeGame.start(level))
+    return redirect(url_for('game.practice_game'))
+
+@bp.route('/practice/guess', methods=['POST'])
+def practice_guess():
+    """Apply a guess to the guest practice game without touching the database."""
+    game = practice.load_game(session.get('practice'))
+    if game is None:
+        flash('Your practice game has expired. Pick a level to start again.', 'info')
+        return redirect(url_for('game.practice_game'))
+    if game.completed:
+        return redirect(url_for('game.practice_game'))
+
+    try:
+        guess_val = int(request.form.get('guess'))
+    except (ValueError, TypeError):
+        flash('Please enter a valid number', 'danger')
+        return redirect(url_for('game.practice_game'))
+
+    hint = game.guess(guess_val)
+    session['practice'] = practice.dump_game(game)
+    return render_template(
+        'game/practice.html',
+        game=game,
+        hint=hint,
+        LEVEL_SETTINGS=levels.all()
     )
 
 @bp.route('/results/<int:game_id>')
 @login_required
 def results(game_id):
     """Show finished game results."""
+    # A finished game never changes, so its results are versioned by id alone
+    tag = f'results:{game_id}'
+    cached = not_modified(tag)
+    if cached:
+        return cached
+
     game = GameSession.query.get_or_404(game_id)
     if game.user_id != current_user.id:
         flash('You cannot access this game', 'danger')
@@ -139,63 +178,59 @@ def results(game_id):
     
     # Calculate attempts used safely
     attempts_used = 0
-    total_attempts = LEVEL_SETTINGS.get(game.level, {}).get('attempts', 0)
+    total_attempts = (levels.get(game.level) or {}).get('attempts', 0)
     if total_attempts > 0:
         attempts_used = total_attempts - game.attempts_left
     
-    return render_template('game/results.html',
+    page = render_template('game/results.html',
                          game=game,
                          attempts_used=attempts_used,
                          total_attempts=total_attempts,
-                         LEVEL_SETTINGS=LEVEL_SETTINGS)
+                         LEVEL_SETTINGS=levels.all())
+    if not game.completed:
+        return page
+    return conditional(page, tag, last_modified=game.end_time)
 
 @bp.route('/leaderboard')
 def leaderboard():
     """Display comprehensive leaderboards with top players and recent winners."""
-    top_players = (
-        User.query
-            .filter(User.best_score > 0)
-            .order_by(User.best_score.desc())
-            .limit(10)
-            .all()
-    )
-    
-    recent_winners = (
-        GameSession.query
-            .options(joinedload(GameSession.user))
-            .filter_by(won=True)
-            .order_by(GameSession.end_time.desc())
-            .limit(10)
-            .all()
-    )
-    
+    all_boards, stamp, last_modified = boards.board_cache.snapshot()
+    level_settings = levels.all()
+    tag = f'leaderboard:{stamp}:{levels.stamp}'
+    cached = not_modified(tag)
+    if cached:
+        return cached
+
     level_leaders = {
         lvl: {
-            'games': (
-                GameSession.query
-                    .options(joinedload(GameSession.user))
-                    .filter_by(level=lvl, won=True)
-                    .order_by(GameSession.score.desc())
-                    .limit(5)
-                    .all()
-            ),
-            'settings': LEVEL_SETTINGS[lvl]
+            'games': all_boards.get(boards.level_board(lvl), [])[:5],
+            'settings': level_settings[lvl]
         }
-        for lvl in LEVEL_SETTINGS
+        for lvl in level_settings
     }
 
-    return render_template(
+    page = render_template(
         'game/leaderboard.html',
-        top_players=top_players,
-        recent_winners=recent_winners,
+        top_players=all_boards.get(boards.PLAYERS, []),
+        recent_winners=all_boards.get(boards.RECENT, []),
         level_leaders=level_leaders,
-        LEVEL_SETTINGS=LEVEL_SETTINGS
+        LEVEL_SETTINGS=level_settings
     )
+    return conditional(page, tag, last_modified=last_modified)
 
 @bp.route('/profile')
 @login_required
 def profile():
     """Display current user's stats and recent games."""
+    # Revalidations are answered from the version alone, without loading the ranks
+    cached = not_modified(f'profile:{current_user.stats_version}:{rank_index.version}')
+    if cached:
+        return cached
+
+    ranks = rank_index.ranks(current_user.id)
+    # Loading the ranks may have bumped the version
+    tag = f'profile:{current_user.stats_version}:{rank_index.version}'
+
     stats = {
         'total_games': current_user.games_played,
         'games_won': current_user.games_won,
@@ -210,10 +245,15 @@ def profile():
             .limit(5)
             .all()
     )
-    return render_template(
-        'user/profile.html',
-        user_stats=stats,
-        recent_games=recent_games
+    return conditional(
+        render_template(
+            'user/profile.html',
+            user_stats=stats,
+            recent_games=recent_games,
+            global_rank=ranks.get(GLOBAL),
+            level_ranks=[(level, ranks[level]) for level in levels.all() if level in ranks]
+        ),
+        tag
     )
 
 @bp.route('/quit', methods=['POST'])
@@ -227,10 +267,7 @@ def quit_game():
         ).order_by(GameSession.created_at.desc()).first()
 
         if game:
-            # Mark game as completed
-            game.completed = True
-            game.end_time = datetime.utcnow()
-            db.session.commit()
+            end_game(game)
             flash('Game ended successfully', 'info')
         else:
             flash('No active game found', 'warning')
@@ -0,0 +1,261 @@
+"""In-memory store for games that are still being played.
+
+When ``ACTIVE_GAME_STORE`` is enabled, guesses are applied to an in-memory
+copy of the GameSession and written to the database in batches by a
+background flusher, instead of one commit per guess. Finished and quit games
+are written through immediately. A worker restart loses at most the guesses
+made during the last ``ACTIVE_GAME_FLUSH_INTERVAL`` seconds.
+"""
+import atexit
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from app import db
+from app.models import GameSession, Guess
+from app.utils import after_commit
+from app.writer import writer
+
+GuessRecord = namedtuple('GuessRecord', 'guess_value result created_at')
+
+
+class ActiveGame:
+    """In-memory copy of an in-progress GameSession"""
+
+    def __init__(self, session):
+        self.id = session.id
+        self.user_id = session.user_id
+        self.level = session.level
+        self.daily_day = session.daily_day
+        self.secret_number = session.secret_number
+        self.attempts_left = session.attempts_left
+        self.current_range_low = session.current_range_low
+        self.current_range_high = session.current_range_high
+        self.completed = False
+        self.won = False
+        self.score = 0
+        self.created_at = session.created_at
+        self.end_time = None
+
+        # Newest first, matching the GameSession.guesses ordering
+        self.guesses = [
+            GuessRecord(g.guess_value, g.result, g.created_at)
+            for g in session.guesses
+        ]
+        # Idempotency keys of guesses already applied, mapped to their result
+        self.keys = {
+            g.client_key: g.result for g in session.guesses if g.client_key
+        }
+        self.pending = []
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+
+
+class ActiveGameStore:
+    """Per-process registry of ActiveGame objects with write-behind flushing"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._games = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('ACTIVE_GAME_STORE', False)
+        self.flush_interval = app.config.get('ACTIVE_GAME_FLUSH_INTERVAL', 5)
+        self.batch_size = app.config.get('ACTIVE_GAME_FLUSH_BATCH', 20)
+        self.idle_timeout = app.config.get('ACTIVE_GAME_IDLE_TIMEOUT', 1800)
+        app.extensions['active_games'] = self
+        if self.enabled:
+            atexit.register(self._flush_on_exit)
+
+    def get(self, game_id):
+        """Return the ActiveGame for ``game_id``, loading it on first use.
+
+        Returns None for missing or already completed games.
+        """
+        with self._lock:
+            game = self._games.get(game_id)
+        if game is None:
+            session = db.session.get(GameSession, game_id)
+            if session is None or session.completed:
+                return None
+            with self._lock:
+                game = self._games.setdefault(game_id, ActiveGame(session))
+        game.last_used = time.monotonic()
+        self._ensure_flusher()
+        return game
+
+    def held_ids(self):
+        """Return the ids of games currently held in memory"""
+        with self._lock:
+            return list(self._games)
+
+    def record(self, game, guess_val, result, client_key=None):
+        """Queue a guess for writing; return True once the batch is full"""
+        now = datetime.utcnow()
+        game.guesses.insert(0, GuessRecord(guess_val, result, now))
+        if client_key:
+            game.keys[client_key] = result
+        game.pending.append({
+            'game_id': game.id,
+            'guess_value': guess_val,
+            'result': result,
+            'client_key': client_key,
+            'created_at': now
+        })
+        return len(game.pending) >= self.batch_size
+
+    def take(self, game):
+        """Remove and return ``game``'s unwritten guess rows; hold ``game.lock``"""
+        rows, game.pending = game.pending, []
+        return rows
+
+    def finish(self, game, rows):
+        """Write a completed game and its last ``rows`` through, inside a writer unit.
+
+        ``rows`` come from take(). The caller saves the player's statistics
+        in the same unit, and the game is forgotten once it commits.
+        """
+        self._write(game, rows, final=True)
+        after_commit(self._forget, game.id)
+
+    def evict(self, game_id):
+        """Write out and drop a game so it can be changed in the database.
+
+        The caller is responsible for committing the session.
+        """
+        with self._lock:
+            game = self._games.pop(game_id, None)
+        if game is not None:
+            with game.lock:
+                # A completed game's final write is already under way
+                if not game.completed:
+                    self._write(game, self.take(game))
+
+    def reopen(self, game, rows, before):
+        """Take back the guess that finished ``game`` after its final write failed.
+
+        ``rows`` are the rows taken for that write, and ``before`` is the
+        (attempts_left, current_range_low, current_range_high) the game had
+        before the guess. The game is playable again, so the
+        player can retry the guess instead of the result being lost.
+        """
+        with game.lock:
+            game.attempts_left, game.current_range_low, game.current_range_high = before
+            game.completed = False
+            game.won = False
+            game.score = 0
+            game.end_time = None
+            # The finishing guess is the newest row; the rest still need writing
+            guess = rows.pop()
+            game.pending[:0] = rows
+            game.guesses.pop(0)
+            game.keys.pop(guess['client_key'], None)
+
+    def flush(self, game_id=None):
+        """Write pending guesses for one or all games, each as a writer unit"""
+        with self._lock:
+            if game_id is None:
+                games = list(self._games.values())
+            else:
+                games = [self._games[game_id]] if game_id in self._games else []
+
+        for game in games:
+            with game.lock:
+                if not game.pending:
+                    continue
+                rows = self.take(game)
+                state = _state(game)
+            # Outside game.lock: units running on the writer take game locks too
+            try:
+                writer.run(write_game, game.id, rows, state)
+            except Exception:
+                with game.lock:
+                    game.pending[:0] = rows
+                raise
+
+        self._evict_idle()
+
+    def _forget(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+
+    def _write(self, game, rows, final=False):
+        write_game(game.id, rows, _state(game, final), final)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for game_id, game in list(self._games.items()):
+                if not game.pending and game.last_used < cutoff:
+                    del self._games[game_id]
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='active-game-flusher',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Active game flush failed')
+
+    def _flush_on_exit(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Active game flush on exit failed')
+
+
+def _state(game, final=False):
+    """Return the GameSession column values of ``game``; hold ``game.lock``"""
+    state = {
+        'attempts_left': game.attempts_left,
+        'current_range_low': game.current_range_low,
+        'current_range_high': game.current_range_high
+    }
+    if final:
+        state.update(
+            completed=game.completed,
+            won=game.won,
+            score=game.score,
+            end_time=game.end_time
+        )
+    return state
+
+
+def write_game(game_id, rows, state, final=False):
+    """Write unit: insert a game's guess ``rows`` and save its ``state``"""
+    if rows:
+        db.session.execute(db.insert(Guess), rows)
+
+    stmt = db.update(GameSession).where(
+        GameSession.id == game_id,
+        GameSession.completed == False
+    )
+    if not final:
+        # Attempts only ever go down; skip writes that would move the
+        # row backwards if two flushes of the same game overlap
+        stmt = stmt.where(GameSession.attempts_left > state['attempts_left'])
+    db.session.execute(stmt.values(version=GameSession.version + 1, **state))
+
+
+active_games = ActiveGameStore()
@@ -0,0 +1,216 @@
+"""Fire concurrent guesses at games and check that none are lost or doubled.
+
+``flask stress-guesses`` runs on a throwaway SQLite database. Every player
+starts a game each round, then several clients post guesses at it at once
+through the JSON API, retrying conflicts and resending some guesses under
+the same Idempotency-Key, until the game is finished. Afterwards:
+
+- every game is finished, and its attempts left plus its stored guesses
+  add up to the attempts it started with;
+- a won game has exactly one correct guess and any other game none;
+- a resent guess got the same answer as the first time;
+- each player's games played, games won and best score match their games.
+
+It builds its own app rather than the configured one, so it also runs as
+``python -m app.game.stress`` where the production database driver is not
+installed.
+"""
+import random
+import tempfile
+import threading
+from collections import Counter
+
+import click
+
+from app import create_app, db
+from app.auth.last_seen import last_seen
+from app.config import Config
+from app.game.store import active_games
+from app.models import GameSession, Guess, User
+
+# Conflict retries per guess before a client gives up on it
+MAX_RETRIES = 50
+
+
+def seed(players):
+    """Create ``players`` players and return their ids"""
+    db.session.execute(db.insert(User), [
+        {
+            'username': f'stress{i}',
+            'email': f'stress{i}@example.com',
+            'password_hash': '',
+            'stats_version': 1
+        }
+        for i in range(players)
+    ])
+    db.session.commit()
+    return db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+
+
+def client_for(app, user_id):
+    """Return a test client logged in as ``user_id``"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def post_guess(client, game_id, value, key):
+    """Post one guess, retrying while another request changed the game first"""
+    for _ in range(MAX_RETRIES):
+        response = client.post(f'/api/game/{game_id}/guess',
+                               json={'guess': value}, headers={'Idempotency-Key': key})
+        if response.status_code != 409 or 'retry' not in response.json['message']:
+            break
+    return response
+
+
+def guess_until_finished(client, game_id, secret, low, high, name, problems):
+    """Post guesses at one game until the API says it is finished"""
+    sent = 0
+    while True:
+        sent += 1
+        key = f'{name}-{sent}'
+        # Now and then the right number, so some games are won
+        value = secret if random.random() < 0.1 else random.randint(low, high)
+        response = post_guess(client, game_id, value, key)
+        if response.status_code == 409 and 'finished' in response.json['message']:
+            return
+        if response.status_code != 200:
+            problems.append(f'game {game_id}: key {key} failed with {response.status_code} '
+                            f'{response.json["message"]!r}')
+            return
+
+        if sent % 3 == 0:
+            # Resend as a client would after losing the response
+            replay = post_guess(client, game_id, value, key)
+            if replay.status_code == 200 and replay.json['hint'] != response.json['hint']:
+                problems.append(f'game {game_id}: key {key} answered '
+                                f'{response.json["hint"]!r}, then {replay.json["hint"]!r}')
+
+
+def play_round(app, clients, level, threads, problems):
+    """Start a game per player and guess at all of them at once; return {game_id: attempts}"""
+    games = {}
+    workers = []
+    for user_id, client in clients.items():
+        response = client.post('/api/game/start', json={'level': level})
+        if response.status_code != 201:
+            raise RuntimeError(f'Starting a game failed with {response.status_code}: {response.json}')
+        game_id = response.json['id']
+        games[game_id] = response.json['attempts_left']
+        low, high = response.json['range']
+        with app.app_context():
+            secret = db.session.get(GameSession, game_id).secret_number
+        for n in range(threads):
+            name = f'{game_id}.{n}'
+            workers.append(threading.Thread(
+                target=guess_until_finished,
+                args=(client_for(app, user_id), game_id, secret, low, high, name, problems)
+            ))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return games
+
+
+def check(games):
+    """Return a list of invariant violations for the played ``games``"""
+    problems = []
+    guesses = dict(db.session.execute(
+        db.select(Guess.game_id, db.func.count(Guess.id)).group_by(Guess.game_id)
+    ).all())
+    correct = dict(db.session.execute(
+        db.select(Guess.game_id, db.func.count(Guess.id))
+            .where(Guess.result == 'correct')
+            .group_by(Guess.game_id)
+    ).all())
+
+    played = Counter()
+    won = Counter()
+    best = Counter()
+    for game in db.session.execute(
+        db.select(GameSession).where(GameSession.id.in_(games))
+    ).scalars():
+        if not game.completed:
+            problems.append(f'game {game.id}: not finished')
+        rows = guesses.get(game.id, 0)
+        if game.attempts_left + rows != games[game.id]:
+            problems.append(f'game {game.id}: {game.attempts_left} attempts left and {rows} '
+                            f'guesses, started with {games[game.id]} attempts')
+        if correct.get(game.id, 0) != (1 if game.won else 0):
+            problems.append(f'game {game.id}: won is {game.won} with '
+                            f'{correct.get(game.id, 0)} correct guesses')
+        played[game.user_id] += game.completed
+        won[game.user_id] += game.won
+        if game.won:
+            best[game.user_id] = max(best[game.user_id], game.score)
+
+    for user in db.session.execute(db.select(User)).scalars():
+        expected = (played[user.id], won[user.id], best[user.id])
+        actual = (user.games_played, user.games_won, user.best_score)
+        if actual != expected:
+            problems.append(f'player {user.username}: played, won and best score are '
+                            f'{actual}, games say {expected}')
+    return problems
+
+
+def run(app, players, rounds, threads, level):
+    """Play ``rounds`` of concurrent games and return (games played, problems)"""
+    with app.app_context():
+        user_ids = seed(players)
+    clients = {user_id: client_for(app, user_id) for user_id in user_ids}
+
+    games = {}
+    problems = []
+    for _ in range(rounds):
+        games.update(play_round(app, clients, level, threads, problems))
+
+    with app.app_context():
+        return len(games), problems + check(games)
+
+
+def make_config(path, store=False):
+    """Return the config of a throwaway app on the SQLite database at ``path``"""
+    class StressConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        ACTIVE_GAME_STORE = store
+        GAME_REAPER_INTERVAL = 0
+        # Every client is let in: this checks guesses, not load shedding
+        RATE_LIMIT_PLAY = ''
+        MAX_CONCURRENT_REQUESTS = 0
+    return StressConfig
+
+
+@click.command('stress-guesses')
+@click.option('--players', type=int, default=4, help='Players, each playing one game per round.')
+@click.option('--rounds', type=int, default=5, help='Games each player plays, one after another.')
+@click.option('--threads', type=int, default=8, help='Clients guessing at each game at once.')
+@click.option('--level', default='hard', help='Level of every game.')
+@click.option('--store', is_flag=True, help='Hold the games in the active-game store.')
+def stress_guesses(players, rounds, threads, level, store):
+    """Fire concurrent guesses at games on a throwaway database and check the results"""
+    with tempfile.TemporaryDirectory() as tmp:
+        stress_app = create_app(make_config(f'{tmp}/stress.db', store))
+        print(f'{players} players, {rounds} rounds, {threads} clients per game'
+              f'{", active-game store" if store else ""}')
+        games, problems = run(stress_app, players, rounds, threads, level)
+        with stress_app.app_context():
+            # Write out now what the exit hooks would, while the database exists
+            last_seen.flush()
+            active_games.flush()
+            db.session.remove()
+            db.engine.dispose()
+
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(f'{len(problems)} problems in {games} games')
+    print(f'{games} games, no lost or doubled guesses')
+
+
+if __name__ == '__main__':
+    stress_guesses()
@@ -0,0 +1,141 @@
+"""Compare the ways of building the leaderboards.
+
+``flask benchmark-leaderboard`` times three strategies on the configured
+database, or with ``--games`` on a throwaway SQLite database filled with
+synthetic players and games:
+
+- fan-out: the query-per-board approach the pages used to take, one query
+  for top players, one for recent winners and one per level;
+- window: the ROW_NUMBER() statements ``rebuild`` uses;
+- materialized: the read of ``leaderboard_entries`` and the day, week and
+  month rollups the pages make now when their cache is cold.
+"""
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db
+from app.game.constants import LEVEL_SETTINGS
+from app.leaderboard import boards
+from app.models import GameSession, User
+
+
+def fan_out(size):
+    """The per-board queries the leaderboard pages used to run"""
+    db.session.execute(
+        db.select(User.username, User.best_score)
+            .where(User.best_score > 0)
+            .order_by(User.best_score.desc())
+            .limit(size)
+    ).all()
+    db.session.execute(
+        db.select(GameSession, User.username)
+            .join(User)
+            .where(GameSession.won == True)
+            .order_by(GameSession.end_time.desc())
+            .limit(size)
+    ).all()
+    for level in LEVEL_SETTINGS:
+        db.session.execute(
+            db.select(GameSession.score, User.username)
+                .join(User)
+                .where(GameSession.level == level, GameSession.won == True)
+                .order_by(GameSession.score.desc())
+                .limit(size)
+        ).all()
+
+
+def window(size):
+    """The ROW_NUMBER() statements used to rebuild the boards"""
+    db.session.execute(boards.ranked_wins(size)).all()
+    db.session.execute(boards.ranked_players(size)).all()
+
+
+def materialized(size):
+    """The reads of the precomputed boards"""
+    boards.boards()
+
+
+STRATEGIES = {
+    'fan-out': fan_out,
+    'window': window,
+    'materialized': materialized
+}
+
+
+def seed(games, players, chunk_size=10000):
+    """Fill an empty database with synthetic players and games"""
+    db.session.execute(db.insert(User), [
+        {
+            'username': f'player{i}',
+            'email': f'player{i}@example.com',
+            'password_hash': '',
+            'stats_version': 1
+        }
+        for i in range(players)
+    ])
+    user_ids = db.session.execute(db.select(User.id)).scalars().all()
+
+    levels = list(LEVEL_SETTINGS.items())
+    start = datetime.utcnow() - timedelta(days=365)
+    for offset in range(0, games, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, games - offset)):
+            level, rules = random.choice(levels)
+            attempts_left = random.randint(0, rules['attempts'] - 1)
+            won = attempts_left > 0 and random.random() < 0.6
+            created_at = start + timedelta(seconds=random.randint(0, 365 * 86400))
+            rows.append({
+                'user_id': random.choice(user_ids),
+                'level': level,
+                'secret_number': random.randint(*rules['range']),
+                'attempts_left': attempts_left,
+                'current_range_low': rules['range'][0],
+                'current_range_high': rules['range'][1],
+                'completed': True,
+                'won': won,
+                'score': int(attempts_left * rules['points_per_attempt'] * rules['multiplier']) if won else 0,
+                'created_at': created_at,
+                'end_time': created_at + timedelta(seconds=random.randint(5, 600)),
+                'version': 1
+            })
+        db.session.execute(db.insert(GameSession), rows)
+        db.session.commit()
+
+    # Player statistics as record_result would have left them
+    best = db.select(db.func.max(GameSession.score)).where(
+        GameSession.user_id == User.id,
+        GameSession.won == True
+    ).scalar_subquery()
+    db.session.execute(db.update(User).values(best_score=db.func.coalesce(best, 0)))
+    db.session.commit()
+    boards.rebuild()
+
+
+def run(size, repeat):
+    """Time each strategy; return {name: (median ms, queries per run)}"""
+    engine = db.engine
+    queries = []
+
+    def count(*args):
+        queries.append(1)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        results = {}
+        for name, strategy in STRATEGIES.items():
+            strategy(size)  # Warm up caches and connections
+            timings = []
+            queries.clear()
+            for _ in range(repeat):
+                started = time.perf_counter()
+                strategy(size)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.session.rollback()
+            results[name] = (statistics.median(timings), len(queries) / repeat)
+        return results
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
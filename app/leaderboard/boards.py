@@ -0,0 +1,419 @@
+"""Materialized leaderboards.
+
+Every leaderboard shown on the site is a handful of rows in the
+``leaderboard_entries`` table: the top ``LEADERBOARD_SIZE`` players by best
+score (board ``'players'``), the latest winning games (``'recent'``) and the
+best winning games of each level (``'level:<level>'``). ``record_win`` keeps
+them current inside the transaction that finishes a game, so the pages read
+a few dozen rows with one query no matter how many games have been played.
+``flask rebuild-leaderboard`` recomputes them from ``game_sessions``. The
+day, week and month boards (``'period:<period>'``) are read from the
+``app.leaderboard.rollups`` buckets, one short index range each.
+
+``board_cache`` keeps the result in memory for ``LEADERBOARD_CACHE_TTL``
+seconds per worker. Only one request at a time recomputes it; the others are
+served the previous value meanwhile. A win invalidates the cache of the
+worker that recorded it as soon as it commits, and other workers see the
+change once their copy expires.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.game.constants import DAILY_LEVEL
+from app.leaderboard import rollups
+from app.leaderboard.ranks import rank_index
+from app.models import GameSession, LeaderboardEntry, User
+from app.utils import after_commit
+
+PLAYERS = 'players'
+RECENT = 'recent'
+
+
+def level_board(level):
+    return f'level:{level}'
+
+
+def period_board(period):
+    return f'period:{period}'
+
+
+def _size():
+    return current_app.config.get('LEADERBOARD_SIZE', 10)
+
+
+def _ranking(board):
+    """ORDER BY for a board, best or newest first"""
+    if board == RECENT:
+        return (LeaderboardEntry.achieved_at.desc(), LeaderboardEntry.id.desc())
+    return (
+        LeaderboardEntry.score.desc(),
+        LeaderboardEntry.achieved_at,
+        LeaderboardEntry.id
+    )
+
+
+def _trim(board, size):
+    """Delete everything below the first ``size`` rows of ``board``"""
+    keep = db.select(LeaderboardEntry.id).where(
+        LeaderboardEntry.board == board
+    ).order_by(*_ranking(board)).limit(size)
+    db.session.execute(
+        db.delete(LeaderboardEntry)
+            .where(
+                LeaderboardEntry.board == board,
+                LeaderboardEntry.id.not_in(keep.scalar_subquery())
+            )
+            .execution_options(synchronize_session=False)
+    )
+
+
+def _offer(board, entry, size):
+    """Insert ``entry`` into a score-ranked board if it makes the top ``size``"""
+    count, lowest = db.session.execute(
+        db.select(db.func.count(LeaderboardEntry.id), db.func.min(LeaderboardEntry.score))
+            .where(LeaderboardEntry.board == board)
+    ).one()
+    if count >= size and entry['score'] <= lowest:
+        return
+    if board == PLAYERS:
+        _upsert_player(entry)
+    else:
+        db.session.execute(db.insert(LeaderboardEntry).values(board=board, **entry))
+    if count >= size:
+        _trim(board, size)
+
+
+def _upsert_player(entry):
+    """Put a player on the players board, keeping their higher score.
+
+    Another win of the same player may have inserted their row since it was
+    looked up; the unique index turns that into an update.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        table = LeaderboardEntry.__table__
+        stmt = insert(table).values(board=PLAYERS, **entry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['board', 'user_id'],
+            index_where=table.c.board == PLAYERS,
+            set_={
+                column: stmt.excluded[column]
+                for column in ('game_id', 'level', 'score', 'attempts_left', 'achieved_at')
+            },
+            where=stmt.excluded.score > table.c.score
+        )
+        db.session.execute(stmt)
+        return
+
+    result = db.session.execute(
+        db.update(LeaderboardEntry)
+            .where(
+                LeaderboardEntry.board == PLAYERS,
+                LeaderboardEntry.user_id == entry['user_id'],
+                LeaderboardEntry.score < entry['score']
+            )
+            .values(**entry)
+            .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0 and db.session.execute(
+        db.select(LeaderboardEntry.id).where(
+            LeaderboardEntry.board == PLAYERS,
+            LeaderboardEntry.user_id == entry['user_id']
+        )
+    ).first() is None:
+        db.session.execute(db.insert(LeaderboardEntry).values(board=PLAYERS, **entry))
+
+
+def record_game(user_id, game):
+    """Add a finished game to the windowed leaderboards, and to the others if won.
+
+    Runs inside the transaction that finishes the game, after the player's
+    statistics have been updated.
+    """
+    rollups.record_game(user_id, game)
+    after_commit(board_cache.invalidate)
+    if game.won:
+        record_win(user_id, game)
+
+
+def record_win(user_id, game):
+    """Add a won game to the leaderboards.
+
+    Runs inside the transaction that finishes the game, after the player's
+    statistics have been updated.
+    """
+    size = _size()
+    after_commit(board_cache.invalidate)
+    after_commit(rank_index.record, user_id, game.level, game.score)
+    entry = {
+        'user_id': user_id,
+        'game_id': game.id,
+        'level': game.level,
+        'score': game.score,
+        'attempts_left': game.attempts_left,
+        'achieved_at': game.end_time or datetime.utcnow()
+    }
+
+    _offer(level_board(game.level), entry, size)
+
+    db.session.execute(db.insert(LeaderboardEntry).values(board=RECENT, **entry))
+    _trim(RECENT, size)
+
+    # Ranked by the player's best score, which may come from an earlier game
+    best_score = db.session.execute(
+        db.select(User.best_score).where(User.id == user_id)
+    ).scalar()
+    current = db.session.execute(
+        db.select(LeaderboardEntry.id, LeaderboardEntry.score).where(
+            LeaderboardEntry.board == PLAYERS,
+            LeaderboardEntry.user_id == user_id
+        )
+    ).first()
+    if current is None:
+        if best_score != game.score:
+            # Back on the board with a best score from an earlier game
+            entry = dict(entry, game_id=None, level=None, attempts_left=None,
+                         achieved_at=None, score=best_score)
+        _offer(PLAYERS, entry, size)
+    elif best_score > current.score:
+        db.session.execute(
+            db.update(LeaderboardEntry)
+                .where(LeaderboardEntry.id == current.id)
+                .values(dict(entry, score=best_score))
+                .execution_options(synchronize_session=False)
+        )
+
+
+def boards():
+    """Return every board as {board: rows}, in display order.
+
+    Rows have board, level, score, attempts_left, achieved_at, username and
+    games_won attributes, except on the period boards, whose rows have
+    username, score, wins and games.
+    """
+    rows = db.session.execute(
+        db.select(
+            LeaderboardEntry.board,
+            LeaderboardEntry.level,
+            LeaderboardEntry.score,
+            LeaderboardEntry.attempts_left,
+            LeaderboardEntry.achieved_at,
+            User.username,
+            User.games_won
+        ).join(
+            User, User.id == LeaderboardEntry.user_id
+        ).order_by(
+            LeaderboardEntry.board,
+            LeaderboardEntry.score.desc(),
+            LeaderboardEntry.achieved_at,
+            LeaderboardEntry.id
+        )
+    ).all()
+
+    size = _size()
+    result = defaultdict(list)
+    for row in rows:
+        result[row.board].append(row)
+    result[RECENT].sort(key=lambda row: row.achieved_at, reverse=True)
+    # Concurrent wins can briefly leave a board one row long
+    all_boards = {board: board_rows[:size] for board, board_rows in result.items()}
+    now = datetime.utcnow()
+    for period in rollups.PERIODS:
+        all_boards[period_board(period)] = rollups.top(period, now)
+    return all_boards
+
+
+def ranked_wins(size):
+    """Select every level's top ``size`` won games and the ``size`` latest wins.
+
+    One statement for all levels: ROW_NUMBER() ranks the won games within
+    each level by score and across levels by end time, and only rows ranked
+    within ``size`` on either are returned.
+    """
+    ranked = db.select(
+        GameSession.id.label('game_id'),
+        GameSession.user_id,
+        GameSession.level,
+        GameSession.score,
+        GameSession.attempts_left,
+        GameSession.end_time.label('achieved_at'),
+        db.func.row_number().over(
+            partition_by=GameSession.level,
+            order_by=(GameSession.score.desc(), GameSession.end_time, GameSession.id)
+        ).label('level_rank'),
+        db.func.row_number().over(
+            order_by=(GameSession.end_time.desc(), GameSession.id.desc())
+        ).label('recent_rank')
+    ).where(
+        GameSession.won == True,
+        GameSession.level != DAILY_LEVEL
+    ).subquery()
+
+    return db.select(ranked).where(
+        db.or_(ranked.c.level_rank <= size, ranked.c.recent_rank <= size)
+    )
+
+
+def ranked_players(size):
+    """Select the top ``size`` players with the first game that reached their best score"""
+    top_players = db.select(User.id, User.best_score).where(
+        User.best_score > 0
+    ).order_by(User.best_score.desc(), User.id).limit(size).subquery()
+
+    best_games = db.select(
+        GameSession.id,
+        GameSession.user_id,
+        GameSession.level,
+        GameSession.score,
+        GameSession.attempts_left,
+        GameSession.end_time,
+        db.func.row_number().over(
+            partition_by=GameSession.user_id,
+            order_by=(GameSession.score.desc(), GameSession.end_time, GameSession.id)
+        ).label('game_rank')
+    ).where(
+        GameSession.won == True,
+        GameSession.level != DAILY_LEVEL,
+        GameSession.user_id.in_(db.select(top_players.c.id))
+    ).subquery()
+
+    return db.select(
+        top_players.c.id.label('user_id'),
+        top_players.c.best_score.label('score'),
+        best_games.c.id.label('game_id'),
+        best_games.c.level,
+        best_games.c.attempts_left,
+        best_games.c.end_time.label('achieved_at')
+    ).outerjoin(
+        best_games,
+        db.and_(
+            best_games.c.user_id == top_players.c.id,
+            best_games.c.game_rank == 1,
+            best_games.c.score == top_players.c.best_score
+        )
+    ).order_by(top_players.c.best_score.desc(), top_players.c.id)
+
+
+def rebuild():
+    """Recompute every board from game_sessions and users; return the row count"""
+    size = _size()
+    db.session.execute(db.delete(LeaderboardEntry))
+
+    columns = ('user_id', 'game_id', 'level', 'score', 'attempts_left', 'achieved_at')
+    rows = []
+    for win in db.session.execute(ranked_wins(size)):
+        entry = {column: getattr(win, column) for column in columns}
+        if win.level_rank <= size:
+            rows.append(dict(entry, board=level_board(win.level)))
+        if win.recent_rank <= size:
+            rows.append(dict(entry, board=RECENT))
+    for player in db.session.execute(ranked_players(size)):
+        rows.append(dict(
+            {column: getattr(player, column) for column in columns},
+            board=PLAYERS
+        ))
+
+    if rows:
+        db.session.execute(db.insert(LeaderboardEntry), rows)
+    db.session.commit()
+    board_cache.invalidate()
+    rank_index.invalidate()
+    return len(rows)
+
+
+def _with_stamp(all_boards):
+    rows = [tuple(row) for board in sorted(all_boards) for row in all_boards[board]]
+    stamp = hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+    last_modified = max(
+        (row.achieved_at for row in all_boards.get(RECENT, []) if row.achieved_at),
+        default=None
+    )
+    return all_boards, stamp, last_modified
+
+
+class BoardCache:
+    """Per-worker cache of ``boards()`` with single-flight refresh"""
+
+    def __init__(self, app=None):
+        self.ttl = 30
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._value = None
+        self._loaded_at = 0
+        self._version = 0
+        self._loaded_version = None
+        self.changed = threading.Event()  # Set on every invalidation
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LEADERBOARD_CACHE_TTL', 30)
+        app.extensions['leaderboard_cache'] = self
+
+    def get(self):
+        """Return the current boards, recomputing them if they are stale"""
+        return self.snapshot()[0]
+
+    def snapshot(self):
+        """Return (boards, stamp, last_modified) for the current boards.
+
+        ``stamp`` changes whenever the content does. While one request
+        recomputes, the others get the previous value; they only wait when
+        there is no previous value at all.
+        """
+        value = self._value
+        if value is not None and self._fresh():
+            self._count('hits')
+            return value
+
+        if not self._refresh_lock.acquire(blocking=value is None):
+            self._count('stale_hits')
+            return value
+        try:
+            # Another request may have refreshed while this one waited
+            if self._value is not None and self._fresh():
+                self._count('hits')
+                return self._value
+            self._count('misses')
+            version = self._version
+            value = _with_stamp(boards())
+            self._value = value
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+            return value
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self):
+        with self._stats_lock:
+            self._version += 1
+        self.changed.set()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits
+        }
+
+    def _fresh(self):
+        return (self._loaded_version == self._version
+                and time.monotonic() - self._loaded_at < self.ttl)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+board_cache = BoardCache()
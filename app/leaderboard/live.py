@@ -0,0 +1,148 @@
+"""Live leaderboard updates over server-sent events.
+
+One producer thread per process watches ``board_cache`` and fans changes
+out to every connected browser: a ``winner`` event for each new row on the
+recent-winners board and a ``leaderboard`` event with the top players and
+recent winners whenever they change. Each event is formatted once and
+queued on every ``app.streaming`` subscriber, and a client that falls
+behind is dropped and reconnects.
+
+Wins recorded by this process wake the producer as soon as they commit.
+Wins in other processes reach it through the cache, at most
+``LEADERBOARD_CACHE_TTL`` seconds later. The producer only reads the
+database while someone is listening.
+"""
+import threading
+
+from app.leaderboard.boards import PLAYERS, RECENT, board_cache
+from app.streaming import format_event
+
+
+def _players(rows):
+    return [
+        {'username': row.username, 'score': row.score, 'games_won': row.games_won}
+        for row in rows
+    ]
+
+
+def _winner(row):
+    return {
+        'username': row.username,
+        'level': row.level,
+        'score': row.score,
+        'attempts_left': row.attempts_left,
+        'achieved_at': row.achieved_at.strftime('%Y-%m-%d %H:%M') if row.achieved_at else ''
+    }
+
+
+def _state(all_boards):
+    return {
+        'players': _players(all_boards.get(PLAYERS, [])),
+        'recent': [_winner(row) for row in all_boards.get(RECENT, [])]
+    }
+
+
+class LiveLeaderboard:
+    """Per-process producer of leaderboard events"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 5
+        self.max_clients = 500
+        self._subscribers = set()
+        self._stamp = None
+        self._players = []
+        self._recent = []
+        self._event_id = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('LEADERBOARD_STREAM_INTERVAL', 5)
+        self.max_clients = app.config.get('LEADERBOARD_STREAM_CLIENTS', 500)
+        app.extensions['live_leaderboard'] = self
+
+    def subscribe(self, subscriber):
+        """Add a subscriber and send it the current boards.
+
+        Returns False when the process already has ``max_clients`` listeners.
+        """
+        all_boards, stamp, _ = board_cache.snapshot()
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return False
+            self._subscribers.add(subscriber)
+            if self._stamp is None:
+                # Later changes are published relative to what this client saw
+                self._remember(all_boards, stamp)
+            subscriber.send(format_event(_state(all_boards), 'leaderboard', self._event_id))
+        self._ensure_thread()
+        return True
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _publish(self, event, data):
+        """Format an event once and queue it for every subscriber"""
+        self._event_id += 1
+        message = format_event(data, event, self._event_id)
+        with self._lock:
+            for subscriber in list(self._subscribers):
+                if not subscriber.send(message):
+                    self._subscribers.discard(subscriber)
+
+    def _check(self):
+        """Publish whatever changed since the last check"""
+        all_boards, stamp, _ = board_cache.snapshot()
+        if stamp == self._stamp:
+            return
+        players = all_boards.get(PLAYERS, [])
+        recent = all_boards.get(RECENT, [])
+        seen = set(self._recent)
+        latest = max((row.achieved_at for row in self._recent if row.achieved_at), default=None)
+        # Oldest first, skipping rows that only resurfaced after a trim
+        for row in reversed(recent):
+            if row in seen or (latest and row.achieved_at and row.achieved_at < latest):
+                continue
+            self._publish('winner', _winner(row))
+        if players != self._players or recent != self._recent:
+            self._publish('leaderboard', _state(all_boards))
+        self._remember(all_boards, stamp)
+
+    def _remember(self, all_boards, stamp):
+        self._stamp = stamp
+        self._players = all_boards.get(PLAYERS, [])
+        self._recent = all_boards.get(RECENT, [])
+
+    def _run(self):
+        while True:
+            board_cache.changed.wait(self.interval)
+            board_cache.changed.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._stamp = None
+                    continue
+            try:
+                with self.app.app_context():
+                    self._check()
+            except Exception:
+                self.app.logger.exception('Publishing leaderboard updates failed')
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='live-leaderboard',
+                    daemon=True
+                )
+                self._thread.start()
+
+
+live_leaderboard = LiveLeaderboard()
@@ -0,0 +1,130 @@
+"""Player ranks by best score, globally and per level.
+
+Each worker keeps every ranked player's best score in sorted lists, so a
+rank or percentile is two binary searches instead of a COUNT over the users
+table. The lists are loaded once per ``RANK_INDEX_TTL`` seconds. Wins
+recorded by this worker are applied as soon as they commit, and wins in
+other workers show up at the next reload.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+from app import db
+from app.game.constants import DAILY_LEVEL
+from app.models import GameSession, User
+
+Rank = namedtuple('Rank', 'rank total percentile')
+
+GLOBAL = None
+
+
+class Ranking:
+    """Sorted best scores of a group of players"""
+
+    def __init__(self, scores_by_user=()):
+        self.by_user = dict(scores_by_user)
+        self.scores = sorted(self.by_user.values())
+
+    def update(self, user_id, score):
+        """Raise the player's best score to ``score`` if it is higher"""
+        old = self.by_user.get(user_id)
+        if old is not None:
+            if score <= old:
+                return
+            del self.scores[bisect_left(self.scores, old)]
+        self.by_user[user_id] = score
+        insort(self.scores, score)
+
+    def rank(self, user_id):
+        """Return the player's Rank, or None if they have no score here.
+
+        Tied players share a rank; ``percentile`` is the share of players
+        with a lower score.
+        """
+        score = self.by_user.get(user_id)
+        if score is None:
+            return None
+        total = len(self.scores)
+        above = total - bisect_right(self.scores, score)
+        below = bisect_left(self.scores, score)
+        return Rank(above + 1, total, 100.0 * below / total)
+
+
+class RankIndex:
+    """Per-worker rankings for the global best score and every level"""
+
+    def __init__(self, app=None):
+        self.ttl = 600
+        self.version = 0
+        self._rankings = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('RANK_INDEX_TTL', 600)
+        app.extensions['rank_index'] = self
+
+    def ranks(self, user_id):
+        """Return {GLOBAL or level: Rank} for every ranking the player is in"""
+        rankings = self._current()
+        with self._lock:
+            ranks = {key: ranking.rank(user_id) for key, ranking in rankings.items()}
+        return {key: rank for key, rank in ranks.items() if rank is not None}
+
+    def record(self, user_id, level, score):
+        """Apply a committed win to the rankings"""
+        rankings = self._rankings
+        if rankings is None or score <= 0:
+            return
+        with self._lock:
+            rankings[GLOBAL].update(user_id, score)
+            rankings.setdefault(level, Ranking()).update(user_id, score)
+            self.version += 1
+
+    def invalidate(self):
+        self._loaded_at = 0
+
+    def _current(self):
+        rankings = self._rankings
+        if rankings is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return rankings
+        # One request reloads; the others keep using the old rankings
+        if self._load_lock.acquire(blocking=rankings is None):
+            try:
+                if self._rankings is None or time.monotonic() - self._loaded_at >= self.ttl:
+                    self._rankings = self._load()
+                    self._loaded_at = time.monotonic()
+                    self.version += 1
+            finally:
+                self._load_lock.release()
+        return self._rankings
+
+    def _load(self):
+        rankings = {
+            GLOBAL: Ranking(db.session.execute(
+                db.select(User.id, User.best_score).where(User.best_score > 0)
+            ).all())
+        }
+        level_bests = db.session.execute(
+            db.select(GameSession.level, GameSession.user_id, db.func.max(GameSession.score))
+                .where(
+                    GameSession.won == True,
+                    GameSession.score > 0,
+                    GameSession.level != DAILY_LEVEL
+                )
+                .group_by(GameSession.level, GameSession.user_id)
+        ).all()
+        by_level = {}
+        for level, user_id, score in level_bests:
+            by_level.setdefault(level, []).append((user_id, score))
+        for level, scores in by_level.items():
+            rankings[level] = Ranking(scores)
+        return rankings
+
+
+rank_index = RankIndex()
@@ -0,0 +1,173 @@
+"""Daily, weekly and monthly leaderboards from pre-aggregated rollups.
+
+Every finished game adds to six ``score_rollups`` rows: the player's games,
+wins and best score for the game's level and for all levels (``'*'``), in
+the day, week (starting Monday) and month the game ended. All six are
+written by one INSERT ... ON CONFLICT DO UPDATE in the transaction that
+finishes the game. A windowed leaderboard is then the first few rows of one
+(period, bucket, level, best_score) index range, however many games were
+played in the period. ``flask backfill-rollups`` rebuilds the table from
+``game_sessions``.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.game.constants import DAILY_LEVEL
+from app.models import GameSession, ScoreRollup, User
+
+ALL_LEVELS = '*'
+PERIODS = ('day', 'week', 'month')
+
+
+def bucket_for(period, moment):
+    """Return the first day of the ``period`` containing ``moment``"""
+    day = moment.date()
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _rows(user_id, level, won, score, moment):
+    return [
+        {
+            'period': period,
+            'bucket': bucket_for(period, moment),
+            'user_id': user_id,
+            'level': row_level,
+            'games': 1,
+            'wins': 1 if won else 0,
+            'best_score': score if won else 0
+        }
+        for period in PERIODS
+        for row_level in (level, ALL_LEVELS)
+    ]
+
+
+def _upsert(rows):
+    """Add ``rows`` to their rollups, creating any that do not exist yet"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        table = ScoreRollup.__table__
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['period', 'bucket', 'user_id', 'level'],
+            set_={
+                'games': table.c.games + stmt.excluded.games,
+                'wins': table.c.wins + stmt.excluded.wins,
+                'best_score': db.case(
+                    (stmt.excluded.best_score > table.c.best_score, stmt.excluded.best_score),
+                    else_=table.c.best_score
+                )
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            db.update(ScoreRollup)
+                .where(
+                    ScoreRollup.period == row['period'],
+                    ScoreRollup.bucket == row['bucket'],
+                    ScoreRollup.user_id == row['user_id'],
+                    ScoreRollup.level == row['level']
+                )
+                .values(
+                    games=ScoreRollup.games + row['games'],
+                    wins=ScoreRollup.wins + row['wins'],
+                    best_score=db.case(
+                        (ScoreRollup.best_score < row['best_score'], row['best_score']),
+                        else_=ScoreRollup.best_score
+                    )
+                )
+                .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.execute(db.insert(ScoreRollup).values(**row))
+
+
+def record_game(user_id, game):
+    """Add a finished game to its player's rollups.
+
+    Runs inside the transaction that finishes the game.
+    """
+    _upsert(_rows(
+        user_id, game.level, game.won, game.score,
+        game.end_time or datetime.utcnow()
+    ))
+
+
+def top(period, moment=None, level=ALL_LEVELS):
+    """Return the best players of the ``period`` containing ``moment``.
+
+    Rows have username, score, wins and games attributes.
+    """
+    bucket = bucket_for(period, moment or datetime.utcnow())
+    return db.session.execute(
+        db.select(
+            User.username,
+            ScoreRollup.best_score.label('score'),
+            ScoreRollup.wins,
+            ScoreRollup.games
+        ).join(
+            User, User.id == ScoreRollup.user_id
+        ).where(
+            ScoreRollup.period == period,
+            ScoreRollup.bucket == bucket,
+            ScoreRollup.level == level,
+            ScoreRollup.best_score > 0
+        ).order_by(
+            ScoreRollup.best_score.desc(),
+            ScoreRollup.wins.desc()
+        ).limit(current_app.config.get('LEADERBOARD_SIZE', 10))
+    ).all()
+
+
+def backfill(chunk_size=5000):
+    """Rebuild every rollup from finished games; return the number of rows"""
+    db.session.execute(db.delete(ScoreRollup))
+
+    totals = {}
+    games = db.session.execute(
+        db.select(
+            GameSession.user_id,
+            GameSession.level,
+            GameSession.won,
+            GameSession.score,
+            GameSession.end_time
+        ).where(
+            GameSession.completed == True,
+            GameSession.end_time.is_not(None),
+            # Challenge games are only ranked on their day's board
+            GameSession.level != DAILY_LEVEL,
+            # Quit and abandoned games never reach record_result; race games
+            # are all counted when the race is saved
+            db.or_(
+                GameSession.won == True,
+                GameSession.attempts_left <= 0,
+                GameSession.race_id.is_not(None)
+            )
+        ).execution_options(yield_per=chunk_size)
+    )
+    for user_id, level, won, score, end_time in games:
+        for row in _rows(user_id, level, won, score or 0, end_time):
+            key = (row['period'], row['bucket'], row['user_id'], row['level'])
+            total = totals.get(key)
+            if total is None:
+                totals[key] = row
+            else:
+                total['games'] += row['games']
+                total['wins'] += row['wins']
+                total['best_score'] = max(total['best_score'], row['best_score'])
+
+    rows = list(totals.values())
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(db.insert(ScoreRollup), rows[start:start + chunk_size])
+    db.session.commit()
+    return len(rows)
@@ -1,58 +1,60 @@
-from flask import render_template
+from flask import render_template, current_app, abort, Response
 from flask_login import login_required
-from app import db
-from app.models import User, GameSession
-from app.leaderboard import bp
+from app.leaderboard import bp, boards
+from app.leaderboard.live import live_leaderboard
+from app.streaming import Subscriber, event_stream
+from app.utils import conditional, not_modified
 
 def get_level_leaderboard(level):
     """Helper function to get top scores for a specific level"""
-    return db.session.query(
-        GameSession.score,
-        User.username
-    ).join(
-        User
-    ).filter(
-        GameSession.level == level,
-        GameSession.won == True
-    ).order_by(
-        GameSession.score.desc()
-    ).limit(10).all()
+    return boards.board_cache.get().get(boards.level_board(level), [])
 
 @bp.route('/')
 @bp.route('/leaderboard')  # Handle both root and /leaderboard paths
 @login_required
 def show_leaderboard():
     """Display the main leaderboard with top players and recent games"""
-    # Get top 10 players by best score
-    top_players = db.session.query(
-        User.username,
-        User.best_score
-    ).order_by(
-        User.best_score.desc()
-    ).limit(10).all()
-
-    # Get recent 10 winning games
-    recent_games = db.session.query(
-        GameSession,
-        User.username
-    ).join(
-        User
-    ).filter(
-        GameSession.won == True
-    ).order_by(
-        GameSession.created_at.desc()
-    ).limit(10).all()
+    # Every board is read from the precomputed leaderboard table in one query
+    all_boards, stamp, last_modified = boards.board_cache.snapshot()
+    tag = f'leaderboard:{stamp}'
+    cached = not_modified(tag)
+    if cached:
+        return cached
 
     # Get level-specific leaderboards
     level_leaderboards = {
-        'easy': get_level_leaderboard('easy'),
-        'medium': get_level_leaderboard('medium'),
-        'hard': get_level_leaderboard('hard')
+        level: all_boards.get(boards.level_board(level), [])
+        for level in ('easy', 'medium', 'hard')
+    }
+
+    period_leaderboards = {
+        title: all_boards.get(boards.period_board(period), [])
+        for title, period in (('Today', 'day'), ('This Week', 'week'), ('This Month', 'month'))
     }
 
-    return render_template(
+    page = render_template(
         'leaderboard/leaderboard.html',
-        top_players=top_players,
-        recent_games=recent_games,
-        level_leaderboards=level_leaderboards
-    )
\ No newline at end of file
+        top_players=all_boards.get(boards.PLAYERS, []),
+        recent_games=all_boards.get(boards.RECENT, []),
+        level_leaderboards=level_leaderboards,
+        period_leaderboards=period_leaderboards
+    )
+    return conditional(page, tag, last_modified=last_modified)
+
+@bp.route('/events')
+def leaderboard_events():
+    """Server-sent event stream of new winners and leaderboard changes"""
+    # Public like the game blueprint's leaderboard page
+    subscriber = Subscriber(current_app.config.get('SSE_QUEUE_SIZE', 100))
+    if not live_leaderboard.subscribe(subscriber):
+        abort(503)
+
+    stream = event_stream(
+        subscriber,
+        heartbeat=current_app.config.get('SSE_HEARTBEAT', 15),
+        on_close=live_leaderboard.unsubscribe
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
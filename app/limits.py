@@ -0,0 +1,182 @@
+"""Admission control for the endpoints that write to the database.
+
+Two checks run before a request touches the database. The first is a token
+bucket per client and budget: the signed-in user id, or the IP address for
+guests. Form posts and API writes are charged; viewing a page is not. A client that uses up a budget such as ``RATE_LIMIT_PLAY``
+("requests/seconds") gets 429 with Retry-After until the bucket refills.
+The second caps how many requests a worker handles at once at
+``MAX_CONCURRENT_REQUESTS``, so a flood cannot queue for every pooled
+connection. Requests past that cap are shed at once with 503.
+
+Buckets and the request count are kept per worker. Rejections are counted
+for the admin dashboard.
+"""
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import abort, g, request, session
+
+# Endpoint -> budget charged by form posts and other writes, not by viewing
+# the page; endpoints sharing a budget share one bucket per client
+ENDPOINTS = {
+    'auth.login': 'login',
+    'auth.register': 'register',
+    'game.start_game': 'play',
+    'game.start_daily': 'play',
+    'game.play': 'play',
+    'game.quit_game': 'play',
+    'api.start_game': 'play',
+    'api.guess': 'play',
+    'api.guess_batch': 'play',
+    'api.quit_game': 'play',
+    'race.create_race': 'play',
+    'race.join_race': 'play',
+    'race.start_race': 'play',
+    'race.race_guess': 'play',
+    'main.feedback': 'feedback',
+}
+
+# Endpoint -> budget charged by every request, for lookups that could be scripted
+LOOKUPS = {
+    'auth.check_available': 'availability',
+}
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Long-lived streams would hold a request slot for as long as they are open
+UNCOUNTED = {'static', 'leaderboard.leaderboard_events', 'race.race_events'}
+
+
+def parse_budget(value):
+    """Return (requests, seconds) from a "requests/seconds" string, or None if disabled"""
+    if not value:
+        return None
+    count, _, seconds = str(value).partition('/')
+    count, seconds = int(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        return None
+    return count, seconds
+
+
+class TokenBucket:
+    """Allows ``capacity`` requests at once, refilling at ``rate`` per second"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend a token; return 0 if allowed, else seconds until one is free"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """Per-client rate limits and a per-worker cap on requests in flight"""
+
+    def __init__(self, app=None):
+        self.budgets = {}
+        self.max_clients = 10000
+        self.max_requests = 0
+        self.in_flight = 0
+        self.rejected = Counter()
+        self._buckets = OrderedDict()
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.budgets = {}
+        for name in set(ENDPOINTS.values()) | set(LOOKUPS.values()):
+            budget = parse_budget(app.config.get(f'RATE_LIMIT_{name.upper()}'))
+            if budget:
+                self.budgets[name] = budget
+        self.max_clients = app.config.get('RATE_LIMIT_CLIENTS', 10000)
+        self.max_requests = app.config.get('MAX_CONCURRENT_REQUESTS', 0)
+        self._slots = threading.BoundedSemaphore(self.max_requests) if self.max_requests > 0 else None
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+        app.extensions['admission_control'] = self
+
+    def admit(self):
+        """Reject the request with 429 or 503 if it may not run now"""
+        budget = LOOKUPS.get(request.endpoint)
+        if budget is None and request.method not in SAFE_METHODS:
+            budget = ENDPOINTS.get(request.endpoint)
+        if budget in self.budgets:
+            wait = self.check(budget, self.client())
+            if wait:
+                self._count(f'rate_limited:{budget}')
+                abort(429, retry_after=math.ceil(wait))
+
+        if self._slots is None or request.endpoint in UNCOUNTED:
+            return
+        if not self._slots.acquire(blocking=False):
+            self._count('shed')
+            abort(503, retry_after=1)
+        g.admitted = True
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self, exception=None):
+        if g.pop('admitted', False):
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def check(self, budget, client):
+        """Spend one request of ``client``'s ``budget``; return seconds to wait, or 0"""
+        count, seconds = self.budgets[budget]
+        key = (budget, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(count, count / seconds)
+                while len(self._buckets) > self.max_clients:
+                    # Forgetting a client only gives it a full bucket again
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take()
+
+    def client(self):
+        """Signed-in user id from the session cookie, without loading the user.
+
+        Guests are keyed on their address, which is only the real client
+        address when ``PROXY_FIX_HOPS`` matches the proxies in front of the app.
+        """
+        user_id = session.get('_user_id')
+        if user_id is not None:
+            return f'user:{user_id}'
+        return f'ip:{request.remote_addr}'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_requests': self.max_requests,
+                'clients': len(self._buckets),
+                'shed': self.rejected['shed'],
+                'rate_limited': {
+                    name: self.rejected[f'rate_limited:{name}'] for name in sorted(self.budgets)
+                }
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            self.rejected[counter] += 1
+
+
+admission = AdmissionControl()
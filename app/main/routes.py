@@ -4,6 +4,7 @@ from app.main import bp
 from app.models import Feedback
 from app.main.forms import FeedbackForm
 from app import db
+from app.writer import writer
 
 @bp.route('/')
 def index():
@@ -20,19 +21,22 @@ def about():
     """Render the about page"""
     return render_template('main/about.html')
 
+def add_feedback(name, email, message, user_id):
+    """Write unit: store a feedback message"""
+    db.session.add(Feedback(name=name, email=email, message=message, user_id=user_id))
+
 @bp.route('/feedback', methods=['GET', 'POST'])
 def feedback():
     """Handle feedback form submission and display"""
     form = FeedbackForm()
     if form.validate_on_submit():
-        feedback = Feedback(
-            name=form.name.data,
-            email=form.email.data,
-            message=form.message.data,
-            user_id=current_user.id if current_user.is_authenticated else None
+        writer.run(
+            add_feedback,
+            form.name.data,
+            form.email.data,
+            form.message.data,
+            current_user.id if current_user.is_authenticated else None
         )
-        db.session.add(feedback)
-        db.session.commit()
         flash('Thank you for your feedback!', 'success')
         return redirect(url_for('main.index'))
     return render_template('main/feedback.html', form=form)
\ No newline at end of file
@@ -1,7 +1,7 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from app import db, login_manager
+from app import db
+from app.passwords import password_hasher
 
 class Setting(db.Model):
     """Application settings model for game levels"""
@@ -15,29 +15,6 @@ class Setting(db.Model):
     score_multiplier = db.Column(db.Float, default=1.0)
     is_active = db.Column(db.Boolean, default=True)
     
-    @classmethod
-    def get_settings(cls, level):
-        """Get or create settings for a specific level"""
-        setting = cls.query.filter_by(level=level).first()
-        if not setting:
-            # Create with default values
-            defaults = {
-                'easy': {'range_high': 100, 'max_attempts': 10, 'score_multiplier': 1.0},
-                'medium': {'range_high': 200, 'max_attempts': 7, 'score_multiplier': 1.5},
-                'hard': {'range_high': 300, 'max_attempts': 5, 'score_multiplier': 2.0}
-            }
-            
-            setting = cls(
-                level=level,
-                range_low=1,
-                range_high=defaults.get(level, {}).get('range_high', 100),
-                max_attempts=defaults.get(level, {}).get('max_attempts', 10),
-                score_multiplier=defaults.get(level, {}).get('score_multiplier', 1.0)
-            )
-            db.session.add(setting)
-            db.session.commit()
-        return setting
-
     def update_ranges(self, min_val, max_val, attempts):
         """Validate and update number ranges"""
         try:
@@ -65,7 +42,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, index=True, nullable=False)
     email = db.Column(db.String(120), unique=True, index=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     is_admin = db.Column(db.Boolean, default=False)
@@ -75,6 +52,13 @@ class User(UserMixin, db.Model):
     games_played = db.Column(db.Integer, default=0)
     games_won = db.Column(db.Integer, default=0)
     best_score = db.Column(db.Integer, default=0)
+    # Bumped whenever the player's games or statistics change (profile ETag)
+    stats_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __table_args__ = (
+        # Top players: the leaderboard rebuild and the players API pages
+        db.Index('ix_users_best_score_id', 'best_score', 'id'),
+    )
     
     # Relationships
     game_sessions = db.relationship(
@@ -87,18 +71,12 @@ class User(UserMixin, db.Model):
     legacy_games = db.relationship('Game', back_populates='player', lazy='dynamic')
     
     def set_password(self, password):
-        """Create hashed password"""
-        self.password_hash = generate_password_hash(password)
+        """Create hashed password; raises HasherBusy when hashing is saturated"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Check hashed password"""
-        return check_password_hash(self.password_hash, password)
-    
-    def update_last_seen(self):
-        """Update last seen timestamp"""
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
-        db.session.commit()
+        """Check hashed password; raises HasherBusy when hashing is saturated"""
+        return password_hasher.verify(self.password_hash, password)
 
 class GameSession(db.Model):
     """Game session model"""
@@ -120,33 +98,143 @@ class GameSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     end_time = db.Column(db.DateTime)
     
+    # Set for a player's game in a multiplayer race
+    race_id = db.Column(db.Integer, db.ForeignKey('races.id'), index=True)
+    # Set for a daily challenge game: the day it belongs to
+    daily_day = db.Column(db.Date)
+    
+    # Optimistic concurrency: every UPDATE checks and bumps the version
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+    
+    __table_args__ = (
+        # A player's latest open game (quit, resume)
+        db.Index('ix_game_sessions_user_open', 'user_id', 'completed', 'created_at'),
+        # A player's recent games (profile)
+        db.Index('ix_game_sessions_user_created', 'user_id', 'created_at'),
+        # All games, newest first (admin)
+        db.Index('ix_game_sessions_created_at', 'created_at'),
+        # Keyset pages of the per-level leaderboard API
+        db.Index('ix_game_sessions_level_won_score_id', 'level', 'won', 'score', 'id'),
+        # One challenge game per player and day
+        db.Index('ix_game_sessions_user_daily_day', 'user_id', 'daily_day', unique=True),
+        # Partial index over open games only, for counts and the reaper
+        db.Index(
+            'ix_game_sessions_open', 'created_at',
+            postgresql_where=db.text('NOT completed'),
+            sqlite_where=db.text('completed = 0')
+        ),
+    )
+    
     # Relationships
     user = db.relationship('User', back_populates='game_sessions')
+    race = db.relationship('Race', back_populates='games')
     guesses = db.relationship(
         'Guess',
         backref='game',
-        lazy='dynamic',
-        order_by='Guess.created_at.desc()'
+        lazy='select',  # One ordered fetch, reused by every template access
+        order_by='Guess.id.desc()'
     )
     
     def calculate_score(self):
         """Calculate score based on level and attempts left"""
-        settings = Setting.get_settings(self.level)
-        if not settings:
+        from app.game.levels import levels
+        rules = levels.get(self.level)
+        if not rules:
             return 0
-            
-        base_score = self.attempts_left * 10
-        return int(base_score * settings.score_multiplier)
+        return int(self.attempts_left * rules['points_per_attempt'] * rules['multiplier'])
+
+class Race(db.Model):
+    """Finished multiplayer race; each player's game is a linked GameSession"""
+    __tablename__ = 'races'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(16), unique=True, index=True, nullable=False)
+    level = db.Column(db.String(20), nullable=False)
+    secret_number = db.Column(db.Integer, nullable=False)
+    winner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    ended_at = db.Column(db.DateTime)
+    
+    games = db.relationship('GameSession', back_populates='race')
+    winner = db.relationship('User')
 
 class Guess(db.Model):
     """Game guess model"""
     __tablename__ = 'guesses'
     
     id = db.Column(db.Integer, primary_key=True)
-    game_id = db.Column(db.Integer, db.ForeignKey('game_sessions.id'), nullable=False)
-    guess_value = db.Column(db.String(100), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game_sessions.id'), nullable=False, index=True)
+    guess_value = db.Column(db.Integer, nullable=False)
     result = db.Column(db.String(50), nullable=False)
+    client_key = db.Column(db.String(64))  # Idempotency key sent by the client
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('game_id', 'client_key', name='uq_guesses_game_client_key'),
+    )
+
+class DailyScore(db.Model):
+    """Winning daily challenge result, one per player and day"""
+    __tablename__ = 'daily_scores'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game_sessions.id'), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('day', 'user_id', name='uq_daily_scores_day_user'),
+        db.Index('ix_daily_scores_day_score', 'day', 'score'),
+    )
+    
+    user = db.relationship('User')
+
+class LeaderboardEntry(db.Model):
+    """Precomputed leaderboard row, kept current as games are won"""
+    __tablename__ = 'leaderboard_entries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    board = db.Column(db.String(32), nullable=False)  # 'players', 'recent' or 'level:<level>'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game_sessions.id'))
+    level = db.Column(db.String(20))
+    score = db.Column(db.Integer, nullable=False)
+    attempts_left = db.Column(db.Integer)
+    achieved_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_leaderboard_entries_board_score', 'board', 'score'),
+        # One row per player on the players board; the game boards hold many
+        db.Index(
+            'ix_leaderboard_entries_players_user', 'board', 'user_id', unique=True,
+            postgresql_where=db.text("board = 'players'"),
+            sqlite_where=db.text("board = 'players'")
+        ),
+    )
+    
+    user = db.relationship('User')
+
+class ScoreRollup(db.Model):
+    """A player's totals for one level, or all levels, in one day, week or month"""
+    __tablename__ = 'score_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(8), nullable=False)  # 'day', 'week' or 'month'
+    bucket = db.Column(db.Date, nullable=False)  # First day of the period
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    level = db.Column(db.String(20), nullable=False)  # '*' for all levels together
+    games = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('period', 'bucket', 'user_id', 'level', name='uq_score_rollups_key'),
+        db.Index('ix_score_rollups_board', 'period', 'bucket', 'level', 'best_score', 'wins'),
+    )
 
 class Feedback(db.Model):
     """User feedback model"""
@@ -188,9 +276,4 @@ class Game(db.Model):
     attempts = db.Column(db.Integer)
     
     # Relationship
-    player = db.relationship('User', back_populates='legacy_games')
-
-@login_manager.user_loader
-def load_user(user_id):
-    """Flask-Login user loader callback"""
-    return User.query.get(int(user_id))
\ No newline at end of file
+    player = db.relationship('User', back_populates='legacy_games')
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""Password hashing off the request threads.
+
+Hashing and verifying a password is deliberately slow, so a burst of logins
+would otherwise keep every worker busy on CPU while game requests wait.
+``password_hasher`` runs them in a pool of ``PASSWORD_HASH_WORKERS``
+processes instead. At most ``PASSWORD_HASH_QUEUE`` jobs may be waiting or
+running per worker; past that, ``HasherBusy`` is raised at once so the page
+can answer 503 rather than queueing the request behind everyone else's.
+With ``PASSWORD_HASH_WORKERS = 0`` the hashes are computed inline.
+
+New hashes use ``PASSWORD_HASH_METHOD``, any werkzeug method such as
+``pbkdf2:sha256:600000`` or ``scrypt:32768:8:1``. Hashes made with other
+parameters still verify, and ``needs_rehash`` tells the login view to store
+a fresh one.
+"""
+import multiprocessing
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import (DEFAULT_PBKDF2_ITERATIONS, check_password_hash,
+                               generate_password_hash)
+
+# Parameters werkzeug fills in when a method leaves them out
+_DEFAULTS = {
+    'pbkdf2': ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)],
+    'scrypt': ['32768', '8', '1'],
+}
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already queued in this worker"""
+
+
+def normalize_method(method):
+    """Return ``method`` with werkzeug's defaults spelled out, as stored in hashes"""
+    name, *params = method.split(':')
+    defaults = _DEFAULTS.get(name, [])
+    return ':'.join([name] + params + defaults[len(params):])
+
+
+class PasswordHasher:
+    """Bounded process pool for password hashes"""
+
+    def __init__(self, app=None):
+        self.method = normalize_method('pbkdf2')
+        self.workers = 0
+        self.queue_size = 0
+        self.timeout = 10
+        self.rejected = 0
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = normalize_method(app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2'))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.queue_size = app.config.get('PASSWORD_HASH_QUEUE', 0) or 4 * max(1, self.workers)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        """Return a new hash of ``password`` using the current policy"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Return True if ``password`` matches ``password_hash``"""
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Return True if ``password_hash`` was made with other parameters"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def _run(self, func, *args):
+        if self.workers <= 0 or self._slots is None:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy()
+        try:
+            pool, future = self._submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the job ends, even after we stop waiting,
+        # so timed-out hashes still count against the queue
+        future.add_done_callback(self._release)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            self.rejected += 1
+            raise HasherBusy()
+        except BrokenProcessPool:
+            # A worker died mid-hash; later calls get a new pool
+            self._discard(pool)
+            self.rejected += 1
+            raise HasherBusy()
+
+    def _submit(self, func, *args):
+        pool = self._executor()
+        try:
+            return pool, pool.submit(func, *args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            pool = self._executor()
+            return pool, pool.submit(func, *args)
+
+    def _release(self, future):
+        self._slots.release()
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # Started on first use, so each server worker has its own.
+                    # Workers start from a clean process rather than a fork of
+                    # this threaded one, which could inherit a held lock.
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=_mp_context())
+        return self._pool
+
+    def _discard(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _mp_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['werkzeug.security'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+password_hasher = PasswordHasher()
+
+
+def benchmark(logins, concurrency):
+    """Verify ``logins`` passwords from ``concurrency`` threads at once.
+
+    Returns (p50 ms, p99 ms, total seconds, rejected) for the successful
+    verifications.
+    """
+    stored = password_hasher.hash('benchmark-password')
+    timings = []
+    rejected = [0]
+
+    def login(_):
+        started = time.perf_counter()
+        try:
+            password_hasher.verify(stored, 'benchmark-password')
+        except HasherBusy:
+            rejected[0] += 1
+            return
+        timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as threads:
+        list(threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    if not timings:
+        return None, None, elapsed, rejected[0]
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return statistics.median(timings), p99, elapsed, rejected[0]
@@ -0,0 +1,221 @@
+"""Query plan checks for the hottest read queries.
+
+Each entry in ``HOT_QUERIES`` mirrors a query run by a page. ``flask
+check-query-plans`` asks the database how it would execute each one and
+reports any that would read a whole table or sort it instead of walking an
+index, or walk a whole index without a LIMIT, so a dropped or unusable
+index is caught before it reaches production. On PostgreSQL sequential
+scans are disabled for the check, as the planner rightly prefers them on
+small development tables.
+"""
+from datetime import datetime
+
+import click
+
+from app import db
+from app.leaderboard.rollups import ALL_LEVELS, bucket_for
+from app.models import GameSession, LeaderboardEntry, ScoreRollup, User
+
+
+def _top_players():
+    return db.select(User.id, User.best_score).where(
+        User.best_score > 0
+    ).order_by(User.best_score.desc(), User.id).limit(10)
+
+
+def _profile_recent_games():
+    return db.select(GameSession).where(
+        GameSession.user_id == 1
+    ).order_by(GameSession.created_at.desc()).limit(5)
+
+
+def _latest_open_game():
+    return db.select(GameSession).where(
+        GameSession.user_id == 1,
+        GameSession.completed == False
+    ).order_by(GameSession.created_at.desc()).limit(1)
+
+
+def _admin_games():
+    return db.select(GameSession).order_by(
+        GameSession.created_at.desc()
+    ).limit(10).offset(10)
+
+
+def _active_game_count():
+    return db.select(db.func.count()).select_from(GameSession).where(
+        GameSession.completed == False,
+        GameSession.created_at <= datetime(2030, 1, 1)
+    )
+
+
+def _reaper_batch():
+    return db.select(GameSession.id, GameSession.created_at).where(
+        GameSession.completed == False,
+        GameSession.created_at < datetime(2030, 1, 1),
+        db.tuple_(GameSession.created_at, GameSession.id) > (datetime(2020, 1, 1), 1)
+    ).order_by(GameSession.created_at, GameSession.id).limit(500)
+
+
+def _all_boards():
+    return db.select(
+        LeaderboardEntry.board,
+        LeaderboardEntry.level,
+        LeaderboardEntry.score,
+        LeaderboardEntry.attempts_left,
+        LeaderboardEntry.achieved_at,
+        User.username,
+        User.games_won
+    ).join(
+        User, User.id == LeaderboardEntry.user_id
+    ).order_by(
+        LeaderboardEntry.board,
+        LeaderboardEntry.score.desc(),
+        LeaderboardEntry.achieved_at,
+        LeaderboardEntry.id
+    )
+
+
+def _board_floor():
+    return db.select(
+        db.func.count(LeaderboardEntry.id), db.func.min(LeaderboardEntry.score)
+    ).where(LeaderboardEntry.board == 'level:easy')
+
+
+def _period_board():
+    return db.select(
+        User.username,
+        ScoreRollup.best_score.label('score'),
+        ScoreRollup.wins,
+        ScoreRollup.games
+    ).join(
+        User, User.id == ScoreRollup.user_id
+    ).where(
+        ScoreRollup.period == 'week',
+        ScoreRollup.bucket == bucket_for('week', datetime(2026, 1, 1)),
+        ScoreRollup.level == ALL_LEVELS,
+        ScoreRollup.best_score > 0
+    ).order_by(
+        ScoreRollup.best_score.desc(),
+        ScoreRollup.wins.desc()
+    ).limit(10)
+
+
+def _api_players_page():
+    return db.select(User.id, User.username, User.best_score.label('score')).where(
+        User.best_score > 0,
+        db.tuple_(User.best_score, User.id) < (500, 100)
+    ).order_by(User.best_score.desc(), User.id.desc()).limit(21)
+
+
+def _api_level_page():
+    return db.select(
+        GameSession.id, GameSession.score, GameSession.level, User.username
+    ).join(
+        User, User.id == GameSession.user_id
+    ).where(
+        GameSession.level == 'easy',
+        GameSession.won == True,
+        db.tuple_(GameSession.score, GameSession.id) < (500, 100)
+    ).order_by(GameSession.score.desc(), GameSession.id.desc()).limit(21)
+
+
+HOT_QUERIES = {
+    'leaderboard rebuild: top players': _top_players,
+    'profile: recent games': _profile_recent_games,
+    'quit: latest open game': _latest_open_game,
+    'admin: games': _admin_games,
+    'admin: active game count': _active_game_count,
+    'reaper: abandoned games': _reaper_batch,
+    'leaderboard: all boards': _all_boards,
+    'leaderboard: board floor on a win': _board_floor,
+    'leaderboard: this week': _period_board,
+    'api: players page': _api_players_page,
+    'api: level page': _api_level_page
+}
+
+# Queries meant to read all of a table that is kept small, with the table:
+# leaderboard_entries is trimmed to LEADERBOARD_SIZE rows per board. Scans
+# and sorts of it are expected; every other step is still checked.
+SMALL_READS = {
+    'leaderboard: all boards': 'leaderboard_entries',
+}
+
+
+def explain(query):
+    """Return the plan for ``query`` as a list of (step, is_problem) pairs"""
+    bind = db.session.get_bind()
+    sql = query.compile(bind, compile_kwargs={'literal_binds': True})
+    # Walking a whole index is only fine when a LIMIT stops it early
+    bounded = ' LIMIT ' in str(sql)
+
+    if bind.dialect.name == 'sqlite':
+        rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return [(row[-1], _sqlite_problem(row[-1], bounded)) for row in rows]
+
+    if bind.dialect.name == 'postgresql':
+        with db.session.begin_nested():
+            db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+            plan = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+        db.session.rollback()
+        steps = []
+        _walk_postgres(plan[0]['Plan'], steps, bounded)
+        return steps
+
+    raise click.ClickException(
+        f'Query plans can only be checked on SQLite and PostgreSQL, not {bind.dialect.name}'
+    )
+
+
+def _sqlite_problem(detail, bounded):
+    # 'SCAN users' reads the whole table; 'SCAN users USING INDEX ...' walks
+    # an index in order, which is fine for ORDER BY ... LIMIT only
+    if detail.startswith('SCAN '):
+        return ' USING ' not in detail or not bounded
+    # Sorting only ties of the index order stops early under a LIMIT, like
+    # a presorted sort on PostgreSQL
+    if detail.startswith('USE TEMP B-TREE FOR RIGHT PART'):
+        return not bounded
+    return detail.startswith('USE TEMP B-TREE')
+
+
+def _walk_postgres(node, steps, bounded, depth=0):
+    node_type = node['Node Type']
+    relation = node.get('Relation Name')
+    label = f'{node_type} on {relation}' if relation else node_type
+    if node.get('Index Name'):
+        label += f' using {node["Index Name"]}'
+    problem = node_type == 'Seq Scan' or (
+        node_type == 'Sort' and not node.get('Presorted Key')
+    ) or (
+        # An index scan with no condition walks the whole index
+        node_type in ('Index Scan', 'Index Only Scan')
+        and 'Index Cond' not in node and not bounded
+    )
+    steps.append(('  ' * depth + label, problem))
+    for child in node.get('Plans', []):
+        _walk_postgres(child, steps, bounded, depth + 1)
+
+
+def _reads_small_table(step, table):
+    step = step.strip()
+    return table in step or step.startswith(('USE TEMP B-TREE', 'Sort'))
+
+
+def check_query_plans():
+    """Explain every hot query; return {name: steps} and the failing names"""
+    plans = {}
+    for name, build in HOT_QUERIES.items():
+        steps = explain(build())
+        table = SMALL_READS.get(name)
+        if table:
+            steps = [
+                (step, problem and not _reads_small_table(step, table))
+                for step, problem in steps
+            ]
+        plans[name] = steps
+    failures = [
+        name for name, steps in plans.items()
+        if any(problem for _, problem in steps)
+    ]
+    return plans, failures
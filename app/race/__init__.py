@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint('race', __name__, url_prefix='/race')
+
+from app.race import routes
@@ -0,0 +1,378 @@
+"""Multiplayer race rooms.
+
+Every player in a room guesses the same secret number, and each guess is
+pushed to everyone in the room as it happens. All room state is owned by one
+asyncio event loop per process, running in a background thread. Request
+handlers hand it commands through ``RaceEngine.call`` and never touch rooms
+directly, so rooms need no locks and nothing polls the database. Connected
+browsers receive events through ``app.streaming`` subscribers.
+
+The database is written once per race, when it finishes: the Race row, one
+GameSession per player with their guesses, and everyone's statistics, all
+in one transaction run off the event loop.
+
+Rooms live in the worker that created them, so run a single worker or route
+``/race/<code>`` requests to workers with sticky sessions.
+"""
+import asyncio
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from app import db
+from app.game.logic import apply_guess
+from app.leaderboard import boards
+from app.models import GameSession, Guess, Race, User
+from app.streaming import format_event
+from app.writer import writer
+
+WAITING = 'waiting'
+RUNNING = 'running'
+FINISHED = 'finished'
+
+
+class RaceError(Exception):
+    """Raised when a room command is not allowed; the message is for the player"""
+
+
+class Player:
+    """One player's game inside a room, playable by ``apply_guess``"""
+
+    def __init__(self, user_id, username, room):
+        self.user_id = user_id
+        self.username = username
+        self.level = room.level
+        self.secret_number = room.secret_number
+        self.attempts_left = room.attempts
+        self.current_range_low, self.current_range_high = room.range
+        self.completed = False
+        self.won = False
+        self.score = 0
+        self.joined_at = datetime.utcnow()
+        self.end_time = None
+        self.guesses = []  # (guess, result, created_at), oldest first
+
+    def to_dict(self):
+        return {
+            'username': self.username,
+            'attempts_left': self.attempts_left,
+            'guesses': [[value, result] for value, result, _ in self.guesses],
+            'completed': self.completed,
+            'won': self.won
+        }
+
+
+class Room:
+    """State of one race, only read or changed on the engine's event loop"""
+
+    def __init__(self, code, fields, rules, host_id):
+        self.code = code
+        self.level = fields['level']
+        self.secret_number = fields['secret_number']
+        self.attempts = fields['attempts_left']
+        self.range = (fields['current_range_low'], fields['current_range_high'])
+        self.rules = rules
+        self.host_id = host_id
+        self.status = WAITING
+        self.players = {}
+        self.winner_id = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.ended_at = None
+        self.subscribers = set()
+        self.event_id = 0
+        self.last_active = time.monotonic()
+
+    def to_dict(self):
+        return {
+            'code': self.code,
+            'level': self.level,
+            'status': self.status,
+            'range': list(self.range),
+            'attempts': self.attempts,
+            'host_id': self.host_id,
+            'players': {
+                user_id: player.to_dict()
+                for user_id, player in self.players.items()
+            },
+            'winner': self.players[self.winner_id].username if self.winner_id else None,
+            'secret': self.secret_number if self.status == FINISHED else None
+        }
+
+
+class RaceEngine:
+    """Per-process owner of all race rooms and their event loop"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.rooms = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_players = app.config.get('RACE_MAX_PLAYERS', 8)
+        self.room_timeout = app.config.get('RACE_ROOM_TIMEOUT', 900)
+        app.extensions['races'] = self
+
+    # Thread-safe entry points for request handlers
+
+    def call(self, func, *args, timeout=5):
+        """Run ``func(*args)`` on the event loop and return its result.
+
+        Exceptions raised by ``func``, such as RaceError, are re-raised here.
+        """
+        async def run():
+            return func(*args)
+        future = asyncio.run_coroutine_threadsafe(run(), self._ensure_loop())
+        return future.result(timeout)
+
+    def call_soon(self, func, *args):
+        """Schedule ``func(*args)`` on the event loop without waiting"""
+        self._ensure_loop().call_soon_threadsafe(func, *args)
+
+    # Room commands, run on the event loop
+
+    def create(self, fields, rules, user_id, username):
+        """Open a room with the given game fields and return its code"""
+        code = secrets.token_urlsafe(6)
+        while code in self.rooms:
+            code = secrets.token_urlsafe(6)
+        room = Room(code, fields, rules, user_id)
+        room.players[user_id] = Player(user_id, username, room)
+        self.rooms[code] = room
+        return code
+
+    def lobby(self):
+        """Return summaries of the rooms still open to new players"""
+        return [
+            {
+                'code': room.code,
+                'level': room.level,
+                'players': [player.username for player in room.players.values()],
+                'created_at': room.created_at
+            }
+            for room in self.rooms.values() if room.status == WAITING
+        ]
+
+    def state(self, code):
+        return self._room(code).to_dict()
+
+    def join(self, code, user_id, username):
+        room = self._room(code)
+        if user_id in room.players:
+            return
+        if room.status != WAITING:
+            raise RaceError('This race has already started.')
+        if len(room.players) >= self.max_players:
+            raise RaceError('This race is full.')
+        player = room.players[user_id] = Player(user_id, username, room)
+        self._publish(room, 'join', {'user_id': user_id, 'player': player.to_dict()})
+
+    def start(self, code, user_id):
+        room = self._room(code)
+        if user_id != room.host_id:
+            raise RaceError('Only the host can start the race.')
+        if room.status != WAITING:
+            raise RaceError('This race has already started.')
+        room.status = RUNNING
+        room.started_at = datetime.utcnow()
+        self._publish(room, 'start', {})
+
+    def guess(self, code, user_id, guess_val):
+        """Apply a player's guess, broadcast it and return the result"""
+        room = self._room(code)
+        player = room.players.get(user_id)
+        if player is None:
+            raise RaceError('You are not in this race.')
+        if room.status != RUNNING:
+            raise RaceError('This race is not running.')
+        if player.completed:
+            raise RaceError('You have no attempts left.')
+
+        result = apply_guess(player, guess_val, room.rules)
+        player.guesses.append((guess_val, result, datetime.utcnow()))
+        self._publish(room, 'guess', {
+            'user_id': user_id,
+            'guess': guess_val,
+            'result': result,
+            'attempts_left': player.attempts_left
+        })
+
+        if player.won:
+            self._finish(room, user_id)
+        elif all(p.completed for p in room.players.values()):
+            self._finish(room, None)
+        return result
+
+    def subscribe(self, code, subscriber):
+        """Add a stream subscriber and send it the room's current state"""
+        room = self._room(code)
+        room.subscribers.add(subscriber)
+        subscriber.send(format_event(room.to_dict(), 'state', room.event_id))
+
+    def unsubscribe(self, code, subscriber):
+        room = self.rooms.get(code)
+        if room is not None:
+            room.subscribers.discard(subscriber)
+
+    # Internals
+
+    def _room(self, code):
+        room = self.rooms.get(code)
+        if room is None:
+            raise RaceError('Race not found.')
+        room.last_active = time.monotonic()
+        return room
+
+    def _publish(self, room, event, data):
+        """Format an event once and queue it for every subscriber"""
+        room.event_id += 1
+        message = format_event(data, event, room.event_id)
+        for subscriber in list(room.subscribers):
+            if not subscriber.send(message):
+                room.subscribers.discard(subscriber)
+
+    def _finish(self, room, winner_id):
+        now = datetime.utcnow()
+        room.status = FINISHED
+        room.winner_id = winner_id
+        room.ended_at = now
+        for player in room.players.values():
+            if not player.completed:
+                player.completed = True
+                player.end_time = now
+        self._publish(room, 'finish', room.to_dict())
+        if room.started_at is not None:
+            asyncio.get_running_loop().create_task(self._save(room))
+
+    async def _save(self, room):
+        # Finished rooms are never changed again, so the executor thread can
+        # read this one while the loop carries on
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._persist, room)
+        except Exception:
+            self.app.logger.exception('Saving race %s failed', room.code)
+
+    def _persist(self, room):
+        """Write a finished race and its players' games in one transaction"""
+        with self.app.app_context():
+            writer.run(self._write_race, room)
+
+    def _write_race(self, room):
+        """Write unit: add the Race row, the players' games and their statistics"""
+        race = Race(
+            code=room.code,
+            level=room.level,
+            secret_number=room.secret_number,
+            winner_id=room.winner_id,
+            created_at=room.created_at,
+            started_at=room.started_at,
+            ended_at=room.ended_at
+        )
+        games = {
+            user_id: GameSession(
+                user_id=user_id,
+                race=race,
+                level=room.level,
+                secret_number=room.secret_number,
+                attempts_left=player.attempts_left,
+                current_range_low=player.current_range_low,
+                current_range_high=player.current_range_high,
+                completed=True,
+                won=player.won,
+                score=player.score,
+                created_at=player.joined_at,
+                end_time=player.end_time
+            )
+            for user_id, player in room.players.items()
+        }
+        db.session.add(race)
+        db.session.add_all(games.values())
+        db.session.flush()
+
+        rows = [
+            {
+                'game_id': games[user_id].id,
+                'guess_value': value,
+                'result': result,
+                'created_at': created_at
+            }
+            for user_id, player in room.players.items()
+            for value, result, created_at in player.guesses
+        ]
+        if rows:
+            db.session.execute(db.insert(Guess), rows)
+
+        db.session.execute(
+            db.update(User)
+                .where(User.id.in_(list(games)))
+                .values(
+                    games_played=User.games_played + 1,
+                    stats_version=User.stats_version + 1
+                )
+                .execution_options(synchronize_session=False)
+        )
+        if room.winner_id is not None:
+            score = room.players[room.winner_id].score
+            db.session.execute(
+                db.update(User)
+                    .where(User.id == room.winner_id)
+                    .values(
+                        games_won=User.games_won + 1,
+                        best_score=db.case(
+                            (User.best_score < score, score),
+                            else_=User.best_score
+                        )
+                    )
+                    .execution_options(synchronize_session=False)
+            )
+        for user_id, game in games.items():
+            boards.record_game(user_id, game)
+
+    async def _sweep(self):
+        """Finish abandoned races and forget old rooms"""
+        while True:
+            await asyncio.sleep(min(60, self.room_timeout))
+            cutoff = time.monotonic() - self.room_timeout
+            for code, room in list(self.rooms.items()):
+                if room.last_active >= cutoff:
+                    continue
+                if room.status == RUNNING:
+                    self._finish(room, None)
+                    room.last_active = time.monotonic()
+                    continue
+                for subscriber in room.subscribers:
+                    subscriber.close()
+                del self.rooms[code]
+
+    def _ensure_loop(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self._loop
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                ready = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(ready,),
+                    name='race-engine',
+                    daemon=True
+                )
+                self._thread.start()
+                ready.wait()
+        return self._loop
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._sweep())
+        ready.set()
+        self._loop.run_forever()
+
+
+races = RaceEngine()
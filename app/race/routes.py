@@ -0,0 +1,102 @@
+from flask import (render_template, request, flash, redirect, url_for, current_app,
+                   jsonify, abort, Response)
+from flask_login import current_user, login_required
+
+from app.game.levels import levels
+from app.game.logic import new_game_fields
+from app.race import bp
+from app.race.engine import RaceError, races
+from app.streaming import Subscriber, event_stream
+
+@bp.route('/')
+@login_required
+def lobby():
+    """List races waiting for players."""
+    return render_template(
+        'race/lobby.html',
+        rooms=races.call(races.lobby),
+        LEVEL_SETTINGS=levels.active()
+    )
+
+@bp.route('/new', methods=['POST'])
+@login_required
+def create_race():
+    """Open a new race room hosted by the current user."""
+    level = request.form.get('level', 'easy')
+    if level not in levels.active():
+        flash('Invalid level selected', 'danger')
+        return redirect(url_for('race.lobby'))
+
+    code = races.call(
+        races.create,
+        new_game_fields(level),
+        levels.get(level),
+        current_user.id,
+        current_user.username
+    )
+    return redirect(url_for('race.room', code=code))
+
+@bp.route('/<code>')
+@login_required
+def room(code):
+    """Show a race room; live updates arrive over the event stream."""
+    try:
+        state = races.call(races.state, code)
+    except RaceError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('race.lobby'))
+    return render_template('race/room.html', race=state, user_id=current_user.id)
+
+@bp.route('/<code>/join', methods=['POST'])
+@login_required
+def join_race(code):
+    try:
+        races.call(races.join, code, current_user.id, current_user.username)
+    except RaceError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('race.lobby'))
+    return redirect(url_for('race.room', code=code))
+
+@bp.route('/<code>/start', methods=['POST'])
+@login_required
+def start_race(code):
+    try:
+        races.call(races.start, code, current_user.id)
+    except RaceError as e:
+        flash(str(e), 'warning')
+    return redirect(url_for('race.room', code=code))
+
+@bp.route('/<code>/guess', methods=['POST'])
+@login_required
+def race_guess(code):
+    """Submit a guess; everyone in the room sees it on their event stream."""
+    try:
+        guess_val = int(request.form.get('guess'))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Please enter a valid number'}), 400
+
+    try:
+        result = races.call(races.guess, code, current_user.id, guess_val)
+    except RaceError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'result': result})
+
+@bp.route('/<code>/events')
+@login_required
+def race_events(code):
+    """Server-sent event stream of everything that happens in the room."""
+    subscriber = Subscriber(current_app.config.get('SSE_QUEUE_SIZE', 100))
+    try:
+        races.call(races.subscribe, code, subscriber)
+    except RaceError:
+        abort(404)
+
+    stream = event_stream(
+        subscriber,
+        heartbeat=current_app.config.get('SSE_HEARTBEAT', 15),
+        on_close=lambda sub: races.call_soon(races.unsubscribe, code, sub)
+    )
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
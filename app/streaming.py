@@ -0,0 +1,72 @@
+"""Server-sent event helpers shared by the live pages.
+
+A producer formats each event once and hands the same string to every
+Subscriber. Each subscriber has a bounded queue: a client that stops
+reading is dropped instead of letting its queue grow, and the browser's
+EventSource reconnects and is sent the current state again.
+"""
+import json
+import queue
+
+
+def format_event(data, event=None, event_id=None):
+    """Return ``data`` as one server-sent event message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':'), default=str))
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscriber:
+    """One connected client's queue of formatted events"""
+
+    def __init__(self, maxsize=100):
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+        self.dropped = False
+
+    def send(self, message):
+        """Queue ``message``; return False once the client is gone or too slow"""
+        if self.closed or self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dropped = True
+            return False
+        return True
+
+    def close(self):
+        """End the stream after the events already queued"""
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            self.dropped = True
+
+
+def event_stream(subscriber, heartbeat=15, on_close=None):
+    """Yield a subscriber's events for a streaming response.
+
+    Sends a comment every ``heartbeat`` seconds while idle so proxies keep
+    the connection open and a disconnected client is noticed. ``on_close``
+    is called with the subscriber when the stream ends for any reason.
+    """
+    try:
+        yield 'retry: 3000\n\n'
+        while not subscriber.dropped:
+            try:
+                message = subscriber.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if message is None:
+                break
+            yield message
+    finally:
+        subscriber.closed = True
+        if on_close is not None:
+            on_close(subscriber)
@@ -0,0 +1,73 @@
+import hashlib
+
+from flask import current_app, get_flashed_messages, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+
+
+def after_commit(func, *args):
+    """Call ``func(*args)`` once the current transaction commits.
+
+    Use it to invalidate caches only after other workers can read the new
+    data. Callbacks are discarded if the transaction rolls back.
+    """
+    db.session.info.setdefault('after_commit', []).append((func, args))
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit(session):
+    for func, args in session.info.pop('after_commit', []):
+        func(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_commit(session):
+    session.info.pop('after_commit', None)
+
+
+def _page_etag(tag):
+    # Pages show the user's name and admin link in the navigation bar
+    if current_user.is_authenticated:
+        viewer = f'{current_user.id}:{current_user.username}:{current_user.is_admin}'
+    else:
+        viewer = 'anonymous'
+    return hashlib.sha1(f'{tag}|{viewer}'.encode()).hexdigest()
+
+
+def not_modified(tag):
+    """Return a 304 response if the client already has version ``tag`` of the page.
+
+    ``tag`` is a cheap version stamp of everything the page shows. Returns
+    None when the page has to be rendered, including while flashed messages
+    are waiting to be shown.
+    """
+    if session.get('_flashes'):
+        return None
+    etag = _page_etag(tag)
+    if etag not in request.if_none_match:
+        return None
+    response = current_app.response_class(status=304)
+    _add_validators(response, etag)
+    return response
+
+
+def conditional(body, tag, last_modified=None):
+    """Turn a rendered page into a response carrying its ETag and Last-Modified"""
+    response = make_response(body)
+    # Messages flashed on this page must not be replayed from a cached copy
+    if response.status_code == 200 and not get_flashed_messages():
+        _add_validators(response, _page_etag(tag), last_modified)
+    return response
+
+
+def _add_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Always revalidate; the page differs per user
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
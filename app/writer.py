@@ -0,0 +1,149 @@
+"""Single writer thread for SQLite.
+
+SQLite lets one connection write at a time. With every request thread
+writing on its own connection, writers wait on the file lock by polling
+(``busy_timeout``), and a transaction that read before another one
+committed fails outright with "database is locked". When the database is
+SQLite, ``writer.run(unit, *args)`` hands the unit of work to one writer
+thread instead. The thread takes whatever units are queued, up to
+``SQLITE_WRITER_BATCH``, runs each inside its own SAVEPOINT so a failing
+unit only undoes itself, and commits the group once. Request threads keep
+reading from WAL snapshots and never hold the write lock.
+
+A unit runs with the writer thread's own ``db.session``, so it must load
+what it changes by id and return plain values, not ORM objects. With other
+databases ``run`` calls the unit inline and commits, so callers behave the
+same everywhere.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from app import db
+
+
+class SQLiteWriter:
+    """Queue of write units executed and group-committed by one thread"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.batch_size = 64
+        self.timeout = 30
+        self.groups = 0
+        self.units = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = (
+            app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+            and app.config.get('SQLITE_SINGLE_WRITER', True)
+        )
+        self.batch_size = app.config.get('SQLITE_WRITER_BATCH', 64)
+        self.timeout = app.config.get('SQLITE_WRITER_TIMEOUT', 30)
+        app.extensions['sqlite_writer'] = self
+
+    def run(self, unit, *args):
+        """Run ``unit(*args)`` as a committed unit of work and return its result.
+
+        Exceptions raised by the unit, or by the commit, are re-raised here.
+        A unit still queued after ``SQLITE_WRITER_TIMEOUT`` seconds is dropped
+        and TimeoutError raised; one already running is waited for.
+        """
+        if threading.current_thread() is self._thread:
+            # Already inside a unit: part of the same transaction
+            return unit(*args)
+        if not self.enabled:
+            try:
+                result = unit(*args)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return result
+
+        # End this thread's read snapshot, so its next query sees the unit's writes
+        db.session.commit()
+        future = Future()
+        self._queue.put((unit, args, future))
+        self._ensure_thread()
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            if future.cancel():
+                # Still queued: it will be skipped, so the write never happens
+                raise
+            # Already running: its group will commit or fail shortly
+            return future.result()
+
+    def _take(self):
+        """Wait for a unit, then return it with whatever else is queued"""
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit_group(self, batch):
+        done = []
+        with self.app.app_context():
+            # Take the write lock up front, so the group never has to upgrade a read
+            db.session.connection(execution_options={'sqlite_begin': 'IMMEDIATE'})
+            for unit, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue  # Its caller gave up waiting
+                callbacks = len(db.session.info.get('after_commit', []))
+                try:
+                    with db.session.begin_nested():
+                        result = unit(*args)
+                except Exception as e:
+                    # Drop the failed unit's after-commit callbacks with its changes
+                    del db.session.info.get('after_commit', [])[callbacks:]
+                    future.set_exception(e)
+                else:
+                    done.append((future, result))
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for future, _ in done:
+                    future.set_exception(e)
+                return
+        self.groups += 1
+        self.units += len(done)
+        for future, result in done:
+            future.set_result(result)
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            try:
+                self._commit_group(batch)
+            except Exception as e:
+                self.app.logger.exception('SQLite writer failed')
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='sqlite-writer',
+                    daemon=True
+                )
+                self._thread.start()
+
+
+writer = SQLiteWriter()
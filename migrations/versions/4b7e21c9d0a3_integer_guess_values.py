@@ -0,0 +1,47 @@
+"""Store guess values as integers and index guesses.game_id
+
+Revision ID: 4b7e21c9d0a3
+Revises:
+Create Date: 2026-10-18 09:12:40.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e21c9d0a3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {col['name']: col for col in inspector.get_columns('guesses')}
+    indexes = {ix['name'] for ix in inspector.get_indexes('guesses')}
+
+    # Tables created by db.create_all() may already have the new schema
+    if not isinstance(columns['guess_value']['type'], sa.Integer):
+        with op.batch_alter_table('guesses', schema=None) as batch_op:
+            batch_op.alter_column(
+                'guess_value',
+                existing_type=sa.String(length=100),
+                type_=sa.Integer(),
+                existing_nullable=False,
+                postgresql_using='guess_value::integer'
+            )
+
+    if 'ix_guesses_game_id' not in indexes:
+        op.create_index('ix_guesses_game_id', 'guesses', ['game_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_guesses_game_id', table_name='guesses')
+    with op.batch_alter_table('guesses', schema=None) as batch_op:
+        batch_op.alter_column(
+            'guess_value',
+            existing_type=sa.Integer(),
+            type_=sa.String(length=100),
+            existing_nullable=False
+        )
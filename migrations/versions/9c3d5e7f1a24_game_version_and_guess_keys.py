@@ -0,0 +1,40 @@
+"""Add GameSession.version and per-guess idempotency keys
+
+Revision ID: 9c3d5e7f1a24
+Revises: 4b7e21c9d0a3
+Create Date: 2026-10-18 11:02:17.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3d5e7f1a24'
+down_revision = '4b7e21c9d0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    game_columns = {col['name'] for col in inspector.get_columns('game_sessions')}
+    guess_columns = {col['name'] for col in inspector.get_columns('guesses')}
+
+    if 'version' not in game_columns:
+        with op.batch_alter_table('game_sessions', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    if 'client_key' not in guess_columns:
+        with op.batch_alter_table('guesses', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('client_key', sa.String(length=64), nullable=True))
+            batch_op.create_unique_constraint('uq_guesses_game_client_key', ['game_id', 'client_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('guesses', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_guesses_game_client_key', type_='unique')
+        batch_op.drop_column('client_key')
+
+    with op.batch_alter_table('game_sessions', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,54 @@
+"""Keep one players board entry per player
+
+Revision ID: a3f6c9e2d518
+Revises: e6b9c3d7a415
+Create Date: 2026-10-18 23:41:07.582916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f6c9e2d518'
+down_revision = 'e6b9c3d7a415'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Concurrent wins may have put a player on the board twice; keep the
+    # higher score, and the older row of two equal ones
+    entries = sa.table(
+        'leaderboard_entries',
+        sa.column('id', sa.Integer),
+        sa.column('board', sa.String),
+        sa.column('user_id', sa.Integer),
+        sa.column('score', sa.Integer)
+    )
+    seen = set()
+    duplicates = []
+    for entry_id, user_id in bind.execute(
+        sa.select(entries.c.id, entries.c.user_id)
+            .where(entries.c.board == 'players')
+            .order_by(entries.c.user_id, entries.c.score.desc(), entries.c.id)
+    ).all():
+        if user_id in seen:
+            duplicates.append(entry_id)
+        seen.add(user_id)
+    if duplicates:
+        bind.execute(entries.delete().where(entries.c.id.in_(duplicates)))
+
+    existing = {index['name'] for index in inspector.get_indexes('leaderboard_entries')}
+    if 'ix_leaderboard_entries_players_user' not in existing:
+        op.create_index('ix_leaderboard_entries_players_user', 'leaderboard_entries',
+                        ['board', 'user_id'], unique=True,
+                        postgresql_where=sa.text("board = 'players'"),
+                        sqlite_where=sa.text("board = 'players'"))
+
+
+def downgrade():
+    op.drop_index('ix_leaderboard_entries_players_user', table_name='leaderboard_entries')
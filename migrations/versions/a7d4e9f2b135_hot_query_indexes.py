@@ -0,0 +1,36 @@
+"""Index the profile and admin game queries
+
+Revision ID: a7d4e9f2b135
+Revises: f3b8c2d1e654
+Create Date: 2026-10-18 15:37:44.802113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e9f2b135'
+down_revision = 'f3b8c2d1e654'
+branch_labels = None
+depends_on = None
+
+
+GAME_SESSION_INDEXES = {
+    'ix_game_sessions_user_created': ['user_id', 'created_at'],
+    'ix_game_sessions_created_at': ['created_at'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {index['name'] for index in inspector.get_indexes('game_sessions')}
+    for name, columns in GAME_SESSION_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'game_sessions', columns, unique=False)
+
+
+def downgrade():
+    for name in reversed(list(GAME_SESSION_INDEXES)):
+        op.drop_index(name, table_name='game_sessions')
@@ -0,0 +1,43 @@
+"""Add materialized leaderboard_entries table
+
+Revision ID: b5c1f8e3a926
+Revises: a7d4e9f2b135
+Create Date: 2026-10-18 16:21:55.047318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c1f8e3a926'
+down_revision = 'a7d4e9f2b135'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fill the new table afterwards with `flask rebuild-leaderboard`
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('leaderboard_entries'):
+        return
+
+    op.create_table('leaderboard_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('board', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=True),
+        sa.Column('level', sa.String(length=20), nullable=True),
+        sa.Column('score', sa.Integer(), nullable=False),
+        sa.Column('attempts_left', sa.Integer(), nullable=True),
+        sa.Column('achieved_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['game_id'], ['game_sessions.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_leaderboard_entries_board_score', 'leaderboard_entries', ['board', 'score'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_leaderboard_entries_board_score', table_name='leaderboard_entries')
+    op.drop_table('leaderboard_entries')
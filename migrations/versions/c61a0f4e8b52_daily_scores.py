@@ -0,0 +1,41 @@
+"""Add daily_scores table for the daily challenge leaderboard
+
+Revision ID: c61a0f4e8b52
+Revises: 9c3d5e7f1a24
+Create Date: 2026-10-18 13:26:51.204377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c61a0f4e8b52'
+down_revision = '9c3d5e7f1a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('daily_scores'):
+        return
+
+    op.create_table('daily_scores',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['game_id'], ['game_sessions.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'user_id', name='uq_daily_scores_day_user')
+    )
+    op.create_index('ix_daily_scores_day_score', 'daily_scores', ['day', 'score'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_daily_scores_day_score', table_name='daily_scores')
+    op.drop_table('daily_scores')
@@ -0,0 +1,29 @@
+"""Add users.stats_version for conditional profile pages
+
+Revision ID: c8e2a5d7f149
+Revises: b5c1f8e3a926
+Create Date: 2026-10-18 17:04:12.663580
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a5d7f149'
+down_revision = 'b5c1f8e3a926'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    user_columns = {col['name'] for col in inspector.get_columns('users')}
+    if 'stats_version' not in user_columns:
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('stats_version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('stats_version')
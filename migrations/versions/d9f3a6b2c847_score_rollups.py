@@ -0,0 +1,43 @@
+"""Add score_rollups for daily, weekly and monthly leaderboards
+
+Revision ID: d9f3a6b2c847
+Revises: c8e2a5d7f149
+Create Date: 2026-10-18 17:46:31.218904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3a6b2c847'
+down_revision = 'c8e2a5d7f149'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fill the new table afterwards with `flask backfill-rollups`
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('score_rollups'):
+        return
+
+    op.create_table('score_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=8), nullable=False),
+        sa.Column('bucket', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('level', sa.String(length=20), nullable=False),
+        sa.Column('games', sa.Integer(), nullable=False),
+        sa.Column('wins', sa.Integer(), nullable=False),
+        sa.Column('best_score', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('period', 'bucket', 'user_id', 'level', name='uq_score_rollups_key')
+    )
+    op.create_index('ix_score_rollups_board', 'score_rollups', ['period', 'bucket', 'level', 'best_score', 'wins'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_score_rollups_board', table_name='score_rollups')
+    op.drop_table('score_rollups')
@@ -0,0 +1,60 @@
+"""Add races table and link race players' game sessions
+
+Revision ID: e2a9b4c7d813
+Revises: c61a0f4e8b52
+Create Date: 2026-10-18 14:08:37.619204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9b4c7d813'
+down_revision = 'c61a0f4e8b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('races'):
+        op.create_table('races',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('code', sa.String(length=16), nullable=False),
+            sa.Column('level', sa.String(length=20), nullable=False),
+            sa.Column('secret_number', sa.Integer(), nullable=False),
+            sa.Column('winner_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('ended_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['winner_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_races_code'), 'races', ['code'], unique=True)
+
+    game_columns = {col['name'] for col in inspector.get_columns('game_sessions')}
+    if 'race_id' not in game_columns and op.get_bind().dialect.name == 'sqlite':
+        # Rebuilding game_sessions would trip the guesses foreign keys, and
+        # SQLite can add a column with its reference in place
+        op.execute(
+            'ALTER TABLE game_sessions ADD COLUMN race_id INTEGER '
+            'CONSTRAINT fk_game_sessions_race_id REFERENCES races (id)'
+        )
+        op.create_index(op.f('ix_game_sessions_race_id'), 'game_sessions', ['race_id'], unique=False)
+    elif 'race_id' not in game_columns:
+        with op.batch_alter_table('game_sessions', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('race_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_game_sessions_race_id', 'races', ['race_id'], ['id'])
+            batch_op.create_index(batch_op.f('ix_game_sessions_race_id'), ['race_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('game_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_game_sessions_race_id'))
+        batch_op.drop_constraint('fk_game_sessions_race_id', type_='foreignkey')
+        batch_op.drop_column('race_id')
+
+    op.drop_index(op.f('ix_races_code'), table_name='races')
+    op.drop_table('races')
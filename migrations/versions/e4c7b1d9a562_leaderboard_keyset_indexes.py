@@ -0,0 +1,34 @@
+"""Index the keyset pages of the leaderboard API
+
+Revision ID: e4c7b1d9a562
+Revises: d9f3a6b2c847
+Create Date: 2026-10-18 18:12:05.431760
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c7b1d9a562'
+down_revision = 'd9f3a6b2c847'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {index['name'] for index in inspector.get_indexes('users')}
+    if 'ix_users_best_score_id' not in existing:
+        op.create_index('ix_users_best_score_id', 'users', ['best_score', 'id'], unique=False)
+
+    existing = {index['name'] for index in inspector.get_indexes('game_sessions')}
+    if 'ix_game_sessions_level_won_score_id' not in existing:
+        op.create_index('ix_game_sessions_level_won_score_id', 'game_sessions',
+                        ['level', 'won', 'score', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_game_sessions_level_won_score_id', table_name='game_sessions')
+    op.drop_index('ix_users_best_score_id', table_name='users')
@@ -0,0 +1,59 @@
+"""Key daily challenge games by player and day
+
+Revision ID: e6b9c3d7a415
+Revises: f5a2d8c3e971
+Create Date: 2026-10-18 22:06:51.390274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b9c3d7a415'
+down_revision = 'f5a2d8c3e971'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    game_columns = {col['name'] for col in inspector.get_columns('game_sessions')}
+    if 'daily_day' not in game_columns:
+        # A plain nullable column: SQLite adds it in place, without a rebuild
+        op.add_column('game_sessions', sa.Column('daily_day', sa.Date(), nullable=True))
+
+    # Key the existing challenge games by the UTC day they were started,
+    # keeping only the first where a race started two on one day
+    games = sa.table(
+        'game_sessions',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('level', sa.String),
+        sa.column('created_at', sa.DateTime),
+        sa.column('daily_day', sa.Date)
+    )
+    seen = set()
+    for game_id, user_id, created_at in bind.execute(
+        sa.select(games.c.id, games.c.user_id, games.c.created_at)
+            .where(games.c.level == 'daily', games.c.daily_day.is_(None))
+            .order_by(games.c.id)
+    ).all():
+        if created_at is None or (user_id, created_at.date()) in seen:
+            continue
+        key = (user_id, created_at.date())
+        seen.add(key)
+        bind.execute(games.update().where(games.c.id == game_id).values(daily_day=key[1]))
+
+    existing = {index['name'] for index in inspector.get_indexes('game_sessions')}
+    if 'ix_game_sessions_user_daily_day' not in existing:
+        op.create_index('ix_game_sessions_user_daily_day', 'game_sessions',
+                        ['user_id', 'daily_day'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_game_sessions_user_daily_day', table_name='game_sessions')
+    with op.batch_alter_table('game_sessions', schema=None) as batch_op:
+        batch_op.drop_column('daily_day')
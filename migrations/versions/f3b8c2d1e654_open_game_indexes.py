@@ -0,0 +1,34 @@
+"""Index open game sessions
+
+Revision ID: f3b8c2d1e654
+Revises: e2a9b4c7d813
+Create Date: 2026-10-18 14:52:09.318442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8c2d1e654'
+down_revision = 'e2a9b4c7d813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    indexes = {index['name'] for index in inspector.get_indexes('game_sessions')}
+
+    if 'ix_game_sessions_user_open' not in indexes:
+        op.create_index('ix_game_sessions_user_open', 'game_sessions',
+                        ['user_id', 'completed', 'created_at'], unique=False)
+    if 'ix_game_sessions_open' not in indexes:
+        op.create_index('ix_game_sessions_open', 'game_sessions', ['created_at'], unique=False,
+                        postgresql_where=sa.text('NOT completed'),
+                        sqlite_where=sa.text('completed = 0'))
+
+
+def downgrade():
+    op.drop_index('ix_game_sessions_open', table_name='game_sessions')
+    op.drop_index('ix_game_sessions_user_open', table_name='game_sessions')
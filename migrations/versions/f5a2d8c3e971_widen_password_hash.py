@@ -0,0 +1,38 @@
+"""Widen users.password_hash for scrypt and longer hash policies
+
+Revision ID: f5a2d8c3e971
+Revises: e4c7b1d9a562
+Create Date: 2026-10-18 18:41:27.905316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a2d8c3e971'
+down_revision = 'e4c7b1d9a562'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite does not enforce VARCHAR lengths, and rebuilding users would trip
+    # the foreign keys that point at it
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=256),
+               existing_nullable=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=256),
+               type_=sa.String(length=128),
+               existing_nullable=True)
@@ -0,0 +1,58 @@
+import pytest
+
+from app import create_app, db
+from app.game.logic import create_game, new_game_fields
+from app.game.store import active_games
+from app.game.stress import make_config
+from app.models import User
+
+
+@pytest.fixture
+def active_game_store():
+    """Whether the app holds games in the active-game store; overridden per module"""
+    return False
+
+
+@pytest.fixture
+def app(tmp_path, active_game_store):
+    class TestConfig(make_config(tmp_path / 'test.db', active_game_store)):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        PASSWORD_HASH_WORKERS = 0
+        # Flushes happen when a test asks for them
+        ACTIVE_GAME_FLUSH_INTERVAL = 3600
+
+    app = create_app(TestConfig)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    # The store is per process, and the next test's games reuse these ids
+    active_games._games.clear()
+
+
+@pytest.fixture
+def app_context(app):
+    # Requests made meanwhile share it, and with it the logged-in user
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def player(app_context):
+    user = User(username='alice', email='alice@example.com', password_hash='')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def game(player):
+    """A new hard game of ``player``"""
+    return create_game(player.id, new_game_fields('hard'))
+
+
+@pytest.fixture
+def wrong_guess(game):
+    high = game.current_range_high
+    return high if game.secret_number != high else high - 1
@@ -0,0 +1,46 @@
+import pytest
+
+from app import db
+from app.game.logic import GameConflict, record_guess, submit_guess
+from app.game.stress import client_for
+from app.models import GameSession, Guess
+from app.writer import writer
+
+
+def guess_rows(game_id):
+    return db.session.execute(
+        db.select(db.func.count(Guess.id)).where(Guess.game_id == game_id)
+    ).scalar()
+
+
+def test_replayed_guess_returns_first_result(game, player, wrong_guess):
+    attempts = game.attempts_left
+    first = submit_guess(game, wrong_guess, player, client_key='k1')
+    # A retry sent before the client saw the new version
+    replay = submit_guess(game, game.secret_number, player, client_key='k1')
+
+    assert replay == first
+    assert guess_rows(game.id) == 1
+    game = db.session.get(GameSession, game.id)
+    assert game.attempts_left == attempts - 1
+    assert not game.completed
+
+
+def test_replayed_api_guess_is_applied_once(app, game, player, wrong_guess):
+    client = client_for(app, player.id)
+    headers = {'Idempotency-Key': 'k1'}
+    first = client.post(f'/api/game/{game.id}/guess', json={'guess': wrong_guess}, headers=headers)
+    replay = client.post(f'/api/game/{game.id}/guess', json={'guess': wrong_guess}, headers=headers)
+
+    assert first.status_code == replay.status_code == 200
+    assert replay.json['hint'] == first.json['hint']
+    assert guess_rows(game.id) == 1
+
+
+def test_stale_version_conflicts(game, player, wrong_guess):
+    seen = game.version
+    submit_guess(game, wrong_guess, player)
+
+    with pytest.raises(GameConflict):
+        writer.run(record_guess, game.id, seen, wrong_guess, player.id)
+    assert guess_rows(game.id) == 1
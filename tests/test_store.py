@@ -0,0 +1,90 @@
+import pytest
+
+from app import db
+from app.game import store
+from app.game.logic import submit_guess
+from app.game.store import active_games
+from app.models import GameSession, Guess, User
+
+
+@pytest.fixture
+def active_game_store():
+    return True
+
+
+def stored_guesses(game_id):
+    return db.session.execute(
+        db.select(Guess.guess_value).where(Guess.game_id == game_id).order_by(Guess.id)
+    ).scalars().all()
+
+
+def stored_game(game_id):
+    db.session.expire_all()
+    return db.session.get(GameSession, game_id)
+
+
+def test_flush_writes_pending_guesses(game, player, wrong_guess):
+    version = game.version
+    held = active_games.get(game.id)
+    submit_guess(held, wrong_guess, player, client_key='k1')
+    submit_guess(held, wrong_guess - 1, player, client_key='k2')
+    assert stored_guesses(game.id) == []
+
+    active_games.flush()
+
+    assert held.pending == []
+    assert stored_guesses(game.id) == [wrong_guess, wrong_guess - 1]
+    row = stored_game(game.id)
+    assert row.attempts_left == held.attempts_left
+    assert row.current_range_high == held.current_range_high
+    assert row.version == version + 1
+
+
+def test_failed_flush_rolls_back_and_keeps_guesses(monkeypatch, game, player, wrong_guess):
+    held = active_games.get(game.id)
+    submit_guess(held, wrong_guess, player)
+    submit_guess(held, wrong_guess - 1, player)
+    attempts = stored_game(game.id).attempts_left
+
+    write_game = store.write_game
+
+    def failing_write(*args):
+        # The guess rows are inserted before the failure
+        write_game(*args)
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(store, 'write_game', failing_write)
+    with pytest.raises(RuntimeError):
+        active_games.flush()
+
+    assert stored_guesses(game.id) == []
+    assert stored_game(game.id).attempts_left == attempts
+    assert [row['guess_value'] for row in held.pending] == [wrong_guess, wrong_guess - 1]
+
+    monkeypatch.undo()
+    active_games.flush()
+    assert stored_guesses(game.id) == [wrong_guess, wrong_guess - 1]
+
+
+def test_failed_finish_reopens_game(monkeypatch, game, player, wrong_guess):
+    held = active_games.get(game.id)
+    submit_guess(held, wrong_guess, player, client_key='k1')
+    attempts = held.attempts_left
+
+    def failing_write(game_id, rows, state, final=False):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(store, 'write_game', failing_write)
+    with pytest.raises(RuntimeError):
+        submit_guess(held, game.secret_number, player, client_key='k2')
+
+    assert not held.completed
+    assert held.attempts_left == attempts
+    assert 'k2' not in held.keys
+    assert [row['client_key'] for row in held.pending] == ['k1']
+    assert not stored_game(game.id).completed
+
+    monkeypatch.undo()
+    assert submit_guess(held, game.secret_number, player, client_key='k2') == 'correct'
+    row = stored_game(game.id)
+    assert row.completed and row.won
+    assert stored_guesses(game.id) == [wrong_guess, game.secret_number]
+    assert db.session.get(User, player.id).games_won == 1
@@ -0,0 +1,15 @@
+import pytest
+
+from app.game import stress
+
+
+@pytest.fixture(params=[False, True], ids=['database', 'store'])
+def active_game_store(request):
+    return request.param
+
+
+def test_concurrent_guesses_are_not_lost_or_doubled(app):
+    games, problems = stress.run(app, players=2, rounds=2, threads=4, level='easy')
+
+    assert games == 4
+    assert problems == []